@@ -0,0 +1,176 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from data_filtering import clean_calls
+from calls_counting import count_calls_within_one_hour
+from export_loader import load_export
+from main_paradela import identificar_devolvidas, process_and_clean_paradela
+from profiling import LOG_DIR
+from return_calls import filter_returns
+from synthetic_export import generate_export
+
+SRC_DIR = Path(__file__).resolve().parent
+SRC1_DIR = SRC_DIR.parent / "src1"
+SIZES = [10_000, 100_000, 1_000_000]
+
+# Stages each pipeline's profile must report for a run to count as complete
+EXPECTED_STAGES = {
+    "main": ["process_and_clean_input", "filter_returns", "analisar_chamadas"],
+    "paradela": ["process_and_clean_paradela", "identificar_devolvidas", "calculo_metricas"],
+    "processamento": [
+        "setup_environment", "contagem_nrs_unicos", "limpeza_dados", "sla_cube",
+        "chamadas_nao_atendidas", "calculo_SLAs", "display_SLAs",
+    ],
+}
+
+# Things the scratch copy of the tree must not carry over
+SCRATCH_IGNORE = shutil.ignore_patterns(
+    "build", "dist", "cache", "store", "output", "output_paradela", "logs", "__pycache__", "*.png"
+)
+
+
+def _src1_module(name):
+    """Import a src1 module; by path for the names src also has (setup_environment)"""
+    if str(SRC1_DIR) not in sys.path:
+        sys.path.append(str(SRC1_DIR))
+    spec = importlib.util.spec_from_file_location(f"src1_{name}", SRC1_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _timed(func, *args, repeat=1):
+    """(best wall seconds over `repeat` runs, result of the last run); stage prints are silenced"""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func(*args)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4), result
+
+
+def bench_functions(export, work_dir, repeat=1):
+    """Time the hot functions on one export; their inputs are prepared untimed, as the pipelines do"""
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        calls = clean_calls(load_export(export))
+    results["count_calls_within_one_hour"], counted = _timed(count_calls_within_one_hour, calls, repeat=repeat)
+    results["filter_returns"], _ = _timed(filter_returns, counted, work_dir, repeat=repeat)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        paradela = process_and_clean_paradela(export, os.path.join(work_dir, "todas_paradela.csv"))
+    results["identificar_devolvidas"], _ = _timed(identificar_devolvidas, paradela, work_dir, repeat=repeat)
+
+    setup_environment = _src1_module("setup_environment")
+    contagem = _src1_module("contagem_nrs_unicos")
+    limpeza = _src1_module("limpeza_dados")
+    nao_atendidas = _src1_module("chamadas_nao_atendidas")
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = setup_environment.carregar_input(export)
+        df = contagem.processar_dados(contagem.contar_chamadas_por_identificador(df))
+        df = limpeza.limpar_dados(df)
+    results["analisar_devolucoes_e_nao_atendidas"], _ = _timed(
+        lambda frame: nao_atendidas.analisar_devolucoes_e_nao_atendidas(frame.copy()), df, repeat=repeat
+    )
+    return results
+
+
+def bench_pipelines(export, scratch):
+    """
+    Run main.py, main_paradela.py and run_processamento.py on the export in a scratch
+    copy of the tree (so the real output folders are untouched), with --profile. A run
+    is ok only if it exits with 0 and its profile has every stage of EXPECTED_STAGES.
+    """
+    src, src1 = scratch / "src", scratch / "src1"
+    if not src.exists():
+        shutil.copytree(SRC_DIR, src, ignore=SCRATCH_IGNORE)
+        shutil.copytree(SRC1_DIR, src1, ignore=SCRATCH_IGNORE)
+
+    runs = {
+        "main": (src, [sys.executable, "main.py", export, "--no-cache", "--profile"]),
+        "paradela": (src, [sys.executable, "main_paradela.py", export, "--profile"]),
+        "processamento": (src1, [sys.executable, "run_processamento.py", "--input", export, "--inicio", "2000-01-01", "--profile"]),
+    }
+    results = {}
+    for pipeline, (cwd, command) in runs.items():
+        report_file = src / "logs" / f"profile_{pipeline}.json"
+        report_file.unlink(missing_ok=True)
+        start = time.perf_counter()
+        run = subprocess.run(
+            command, cwd=cwd, capture_output=True, text=True,
+            env={**os.environ, "MPLBACKEND": "Agg"},
+        )
+        stages = json.loads(report_file.read_text(encoding="utf-8"))["stages"] if report_file.exists() else []
+        missing = [name for name in EXPECTED_STAGES[pipeline] if name not in {s["stage"] for s in stages}]
+        results[pipeline] = {
+            "wall_s": round(time.perf_counter() - start, 4),
+            "returncode": run.returncode,
+            "ok": run.returncode == 0 and not missing,
+            "missing_stages": missing,
+            "stages": stages or None,
+        }
+        if run.returncode:
+            results[pipeline]["error"] = run.stderr.strip().splitlines()[-1:]
+    return results
+
+
+def run_benchmark(sizes=SIZES, seed=0, repeat=1, pipelines=True, keep=None):
+    """Generate an export per size, time the hot functions and pipelines, write logs/benchmark.json"""
+    work_dir = Path(keep) if keep else Path(tempfile.mkdtemp(prefix="benchmark_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    report = {"created": datetime.now().isoformat(timespec="seconds"), "seed": seed, "sizes": []}
+    try:
+        for rows in sizes:
+            export = work_dir / f"export_{rows}.csv"
+            start = time.perf_counter()
+            written = generate_export(export, rows, seed=seed, origin_totals=True)
+            print(f"\n📄 {written} linhas geradas em {time.perf_counter() - start:.1f}s")
+
+            entry = {"rows": written, "functions": bench_functions(str(export), str(work_dir), repeat)}
+            for name, seconds in entry["functions"].items():
+                print(f"  - {name}: {seconds:.3f}s")
+            if pipelines:
+                entry["pipelines"] = bench_pipelines(str(export), work_dir / "tree")
+                for name, run in entry["pipelines"].items():
+                    if run["ok"]:
+                        status = "✅"
+                    elif run["returncode"]:
+                        status = f"❌ {run.get('error')}"
+                    else:
+                        status = f"❌ etapas em falta: {', '.join(run['missing_stages'])}"
+                    print(f"  - {name}: {run['wall_s']:.2f}s {status}")
+            report["sizes"].append(entry)
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    LOG_DIR.mkdir(exist_ok=True)
+    report_file = LOG_DIR / "benchmark.json"
+    report_file.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n📁 Resultados guardados em: {report_file}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Medir as funções críticas e as pipelines com exportações sintéticas")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Linhas por exportação (por omissão: 10k, 100k e 1M)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Repetições por função (fica o melhor tempo)")
+    parser.add_argument("--no-pipelines", action="store_true", help="Medir só as funções, sem correr as pipelines completas")
+    parser.add_argument("--keep", help="Pasta onde guardar as exportações geradas (por omissão são apagadas)")
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, seed=args.seed, repeat=args.repeat, pipelines=not args.no_pipelines, keep=args.keep)
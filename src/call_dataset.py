@@ -0,0 +1,165 @@
+import argparse
+import glob
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import DATASET_DIR
+from export_loader import UNUSED_COLUMNS, load_export
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # the dataset needs pyarrow; plain CSV exports are still read without it
+    pq = None
+
+LEG_ID = "Identificação Chamada"
+
+# Layout of the dataset directory (Hive-style, so pyarrow, duckdb, ... read it as is):
+#   year=2025/month=03/part-00001.parquet, ...   the export rows started in that month,
+#                                                 one part per ingest, never rewritten
+# Rows are kept as load_export(unquote=False) parses them: every column, numbers and
+# identifiers still in their quotes, dates parsed, newest first like the exports.
+
+
+def _month_dir(dataset_dir, year, month):
+    return Path(dataset_dir) / f"year={year}" / f"month={month:02d}"
+
+
+def _month_start(month_dir):
+    return pd.Timestamp(int(month_dir.parent.name.split("=")[1]), int(month_dir.name.split("=")[1]), 1)
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise ImportError("pyarrow não instalado: o dataset de chamadas precisa dele")
+
+
+def day_range(start=None, end=None):
+    """(start, end) of whole days given as 'YYYY-MM-DD', the end day included; None if neither is given"""
+    if start is None and end is None:
+        return None
+    return (
+        pd.Timestamp(start) if start else None,
+        pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1) if end else None,
+    )
+
+
+def partitions(dataset_dir=DATASET_DIR, start=None, end=None):
+    """Month directories (newest first) that can hold calls started in [start, end]"""
+    selected = []
+    for month_dir in sorted(Path(dataset_dir).glob("year=*/month=*"), reverse=True):
+        first = _month_start(month_dir)
+        if start is not None and first + pd.offsets.MonthBegin(1) <= pd.Timestamp(start):
+            continue
+        if end is not None and first > pd.Timestamp(end):
+            continue
+        selected.append(month_dir)
+    return selected
+
+
+def ingest(input_file, dataset_dir=DATASET_DIR):
+    """
+    Add an export to the dataset, one new part per month it covers. Legs already
+    stored (same Identificação Chamada) are skipped, so overlapping exports can be
+    ingested in any number; rows without a valid start date are left out.
+    Returns {(year, month): new rows}.
+    """
+    _require_pyarrow()
+    df = load_export(input_file, drop_columns=(), unquote=False)
+    invalid = df["Data de Início"].isna()
+    if invalid.any():
+        print(f"⏰ {int(invalid.sum())} linhas sem Data de Início válida não entram no dataset")
+    df = df[~invalid]
+    df["Tipo"] = df["Tipo"].astype(str)
+
+    added = {}
+    start = df["Data de Início"]
+    for (year, month), rows in df.groupby([start.dt.year, start.dt.month], sort=False):
+        month_dir = _month_dir(dataset_dir, year, month)
+        parts = sorted(month_dir.glob("part-*.parquet"))
+        if parts:
+            stored = pd.concat([pd.read_parquet(part, columns=[LEG_ID]) for part in parts])[LEG_ID]
+            rows = rows[~rows[LEG_ID].isin(stored.dropna())]
+        if rows.empty:
+            continue
+
+        month_dir.mkdir(parents=True, exist_ok=True)
+        part = month_dir / f"part-{len(parts) + 1:05d}.parquet"
+        tmp = part.with_name(f"{part.name}.{os.getpid()}.tmp")
+        rows.to_parquet(tmp, index=False)
+        os.replace(tmp, part)
+        added[(year, month)] = len(rows)
+    return added
+
+
+def load_dataset(dataset_dir=DATASET_DIR, date_range=None, drop_columns=UNUSED_COLUMNS, unquote=True):
+    """
+    The calls of the dataset as load_export() gives those of one export (newest
+    first, same columns and types). With date_range=(start, end), only the month
+    partitions overlapping it are opened and only the rows within it are read.
+    """
+    _require_pyarrow()
+    start, end = date_range or (None, None)
+    selected = partitions(dataset_dir, start, end)
+    if not selected:
+        raise FileNotFoundError(f"Nenhuma partição do dataset {dataset_dir} cobre o intervalo pedido")
+
+    filters = []
+    if start is not None:
+        filters.append(("Data de Início", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("Data de Início", "<=", pd.Timestamp(end)))
+    drop_columns = set(drop_columns)
+    frames = []
+    for month_dir in selected:
+        for part in sorted(month_dir.glob("part-*.parquet")):
+            columns = [col for col in pq.read_schema(part).names if col not in drop_columns]
+            frames.append(pq.read_table(part, columns=columns, filters=filters or None).to_pandas())
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df.sort_values("Data de Início", ascending=False, kind="stable", ignore_index=True)
+    for col in df.columns[df.dtypes == object]:
+        # Empty fields come back as None; the CSV reader gives NaN
+        df[col] = df[col].mask(df[col].isna(), np.nan)
+        if unquote:
+            df[col] = df[col].str.replace(r"^'(.*)'$", r"\1", regex=True)
+    df["Tipo"] = df["Tipo"].astype("category")
+    return df
+
+
+def load_calls(source, date_range=None, drop_columns=UNUSED_COLUMNS, unquote=True):
+    """The calls of an export (a CSV file) or of the dataset (its directory)"""
+    if Path(source).is_dir():
+        return load_dataset(source, date_range, drop_columns, unquote)
+    return load_export(source, drop_columns, unquote, date_range=date_range)
+
+
+def summary(dataset_dir=DATASET_DIR):
+    """Rows and parts per month partition, oldest first"""
+    _require_pyarrow()
+    return pd.DataFrame(
+        [
+            (f"{_month_start(month_dir):%Y-%m}", len(parts), sum(pq.read_metadata(part).num_rows for part in parts))
+            for month_dir in reversed(partitions(dataset_dir))
+            for parts in [sorted(month_dir.glob("part-*.parquet"))]
+        ],
+        columns=["mês", "partes", "linhas"],
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Juntar exportações ao dataset de chamadas particionado por ano/mês")
+    parser.add_argument("input_files", nargs="*", help="CSVs exportados, ou padrões como input/*.csv (sem nenhum, só mostra o resumo)")
+    parser.add_argument("--dataset", default=DATASET_DIR, help=f"Pasta do dataset (por omissão: {DATASET_DIR})")
+    args = parser.parse_args()
+
+    # Padrões expandidos aqui também, para shells que não o fazem (Windows)
+    for input_file in [f for pattern in args.input_files for f in (sorted(glob.glob(pattern)) or [pattern])]:
+        added = ingest(input_file, args.dataset)
+        months = ", ".join(f"{year}-{month:02d}" for year, month in sorted(added)) or "nenhum"
+        print(f"🗂️ {input_file}: {sum(added.values())} linhas novas (meses: {months})")
+
+    if partitions(args.dataset):
+        print(summary(args.dataset).to_string(index=False))
+    else:
+        print(f"⚠️ Dataset vazio: {args.dataset}")
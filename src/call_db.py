@@ -0,0 +1,158 @@
+import argparse
+import sqlite3
+from pathlib import Path
+import pandas as pd
+from config import CALL_DB_FILE
+from export_loader import DATE_FORMAT
+from number_normalization import normalize_numbers
+from return_calls import RETURN_WINDOW
+
+CALL_ID = "Identificador Global da Chamada"
+RECEIVED_TYPES = ("Chamada Não Atendida", "Chamada recebida")
+
+# Cleaned-call columns kept in the database; dates are stored as DATE_FORMAT text,
+# which sorts chronologically and is what SQLite's datetime() returns
+COLUMNS = [
+    CALL_ID, "Tipo", "Data de Início", "Data de Fim", "Origem", "Destino", "Destino Final",
+    "Origem_norm", "Destino_norm", "Tempo de Espera (s)", "Duração (s)",
+]
+DATE_COLUMNS = ["Data de Início", "Data de Fim"]
+
+# Origem_norm is the caller (retry counts), Destino_norm the number an outgoing
+# call reached (Destino Final, return matching). Both indexes carry Tipo and the
+# call id, so the lookups below are answered from the index alone.
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS calls (
+    "{CALL_ID}" TEXT PRIMARY KEY,
+    "Tipo" TEXT NOT NULL,
+    "Data de Início" TEXT,
+    "Data de Fim" TEXT,
+    "Origem" TEXT,
+    "Destino" TEXT,
+    "Destino Final" TEXT,
+    "Origem_norm" TEXT,
+    "Destino_norm" TEXT,
+    "Tempo de Espera (s)" INTEGER,
+    "Duração (s)" INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_calls_origem ON calls ("Origem_norm", "Data de Início", "Tipo", "{CALL_ID}");
+CREATE INDEX IF NOT EXISTS idx_calls_destino ON calls ("Destino_norm", "Data de Início", "Tipo", "{CALL_ID}");
+CREATE INDEX IF NOT EXISTS idx_calls_inicio ON calls ("Data de Início");
+"""
+
+# Retries: calls (not outgoing) of the same caller in the hour before each call, inclusive
+RETRIES_SQL = f"""
+SELECT c.*, (
+    SELECT COUNT(*) FROM calls p INDEXED BY idx_calls_origem
+    WHERE p."Origem_norm" = c."Origem_norm"
+      AND p."Data de Início" BETWEEN datetime(c."Data de Início", '-1 hour') AND c."Data de Início"
+      AND p."Tipo" != 'Chamada efetuada'
+) AS "Total Chamadas"
+FROM calls c
+WHERE c."Tipo" IN {RECEIVED_TYPES} AND c."Data de Início" >= ? AND c."Data de Início" < ?
+"""
+
+# Returns: first outgoing call to each missed caller within RETURN_WINDOW
+RETURNS_SQL = f"""
+WITH matched AS (
+    SELECT m."Data de Início" AS "Data Chamada Não Atendida", (
+        SELECT o."{CALL_ID}" FROM calls o INDEXED BY idx_calls_destino
+        WHERE o."Destino_norm" = m."Origem_norm"
+          AND o."Data de Início" > m."Data de Início"
+          AND o."Data de Início" <= datetime(m."Data de Início", '+{int(RETURN_WINDOW.total_seconds())} seconds')
+          AND o."Tipo" = 'Chamada efetuada'
+        ORDER BY o."Data de Início"
+        LIMIT 1
+    ) AS return_id
+    FROM calls m
+    WHERE m."Tipo" = 'Chamada Não Atendida' AND m."Data de Início" >= ? AND m."Data de Início" < ?
+)
+SELECT o.*, matched."Data Chamada Não Atendida"
+FROM matched JOIN calls o ON o."{CALL_ID}" = matched.return_id
+ORDER BY o."Data de Início"
+"""
+
+_connections = {}
+
+
+def connect(db_file=CALL_DB_FILE):
+    """One connection per database file, reused by every call in the process"""
+    db_file = str(db_file)
+    connection = _connections.get(db_file)
+    if connection is None:
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(db_file)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        _connections[db_file] = connection
+    return connection
+
+
+def save_calls(df, db_file=CALL_DB_FILE):
+    """
+    Upsert cleaned calls (clean_calls output) by global call id; overlapping
+    exports just rewrite the same rows. Returns the number of rows written.
+    """
+    df = df[df[CALL_ID].notna()].copy()
+    df["Origem_norm"] = normalize_numbers(df["Origem"])
+    df["Destino_norm"] = normalize_numbers(df["Destino Final"])
+    for col in DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col], errors="coerce").dt.strftime(DATE_FORMAT)
+    df["Tipo"] = df["Tipo"].astype(str)
+    rows = df[COLUMNS].astype(object).where(df[COLUMNS].notna(), None).itertuples(index=False, name=None)
+
+    connection = connect(db_file)
+    placeholders = ", ".join("?" * len(COLUMNS))
+    quoted = ", ".join(f'"{col}"' for col in COLUMNS)
+    with connection:
+        connection.executemany(f"INSERT OR REPLACE INTO calls ({quoted}) VALUES ({placeholders})", rows)
+    return len(df)
+
+
+def _range(start, end):
+    """[start, end] in days as DATE_FORMAT bounds, the end exclusive"""
+    lower = pd.Timestamp(start).strftime(DATE_FORMAT) if start else "0000-01-01 00:00:00"
+    upper = (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime(DATE_FORMAT) if end else "9999-12-31 23:59:59"
+    return lower, upper
+
+
+def _frame(cursor):
+    df = pd.DataFrame(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+    for col in DATE_COLUMNS + ["Data Chamada Não Atendida"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, errors="coerce")
+    return df
+
+
+def read_received(start=None, end=None, db_file=CALL_DB_FILE):
+    """The recebidas frame (with Total Chamadas) of the calls started in [start, end]"""
+    df = _frame(connect(db_file).execute(RETRIES_SQL, _range(start, end)))
+    df["Total Chamadas"] = df["Total Chamadas"].astype("Int64")
+    return df.sort_values("Data de Início", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def read_returns(start=None, end=None, db_file=CALL_DB_FILE):
+    """The devolvidas frame of the missed calls started in [start, end]"""
+    df = _frame(connect(db_file).execute(RETURNS_SQL, _range(start, end)))
+    if df.empty:
+        return pd.DataFrame()
+    df["Tempo até Devolução (s)"] = (df["Data de Início"] - df["Data Chamada Não Atendida"]).dt.total_seconds()
+    return df
+
+
+if __name__ == "__main__":
+    import metricas
+    from call_metrics import compute_metrics
+
+    parser = argparse.ArgumentParser(description="SLAs de um período a partir da base de dados SQLite de chamadas")
+    parser.add_argument("--inicio", help="Data de início YYYY-MM-DD")
+    parser.add_argument("--fim", help="Data de fim YYYY-MM-DD")
+    parser.add_argument("--db", default=CALL_DB_FILE, help=f"Base de dados (por omissão: {CALL_DB_FILE})")
+    args = parser.parse_args()
+
+    recebidas = read_received(args.inicio, args.fim, args.db)
+    if recebidas.empty:
+        print("⚠️ Nenhuma chamada no período indicado.")
+    else:
+        metricas.log_metrics(compute_metrics(recebidas, read_returns(args.inicio, args.fim, args.db)))
@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from durations import add_duration_seconds, DURATION_COLUMNS
+from number_normalization import normalize_numbers
+
+ANSWERED = "chamada recebida"
+MISSED = "chamada não atendida"
+
+
+@dataclass(frozen=True)
+class CallMetrics:
+    """SLA figures of one analysis; the counts of calls are over received + missed calls"""
+    total_calls: int
+    answered: int
+    missed: int
+    answered_pct: float
+    missed_pct: float
+    answered_under_60s: int
+    answered_under_20s: int
+    answered_under_60s_pct: float
+    mean_wait_s: float
+    mean_duration_s: float
+    answered_first_attempt: int
+    answered_numbers: int          # answered calls with a retry count (one per caller and hour)
+    missed_numbers: int
+    mean_attempts_answered: float
+    mean_attempts_missed: float
+    missed_origins: int            # distinct numbers among the missed calls
+    returned: int
+    returned_numbers: int
+    returned_within_3min_pct: float
+    returned_within_15min_pct: float
+    mean_return_s: float
+    mean_return_duration_s: float
+    missed_not_returned_numbers: int
+    all_calls: int                 # rows of any type, outgoing calls included
+    all_numbers: int
+    mean_calls_per_number: float   # per row: calls of its Origem
+
+
+def _pct(part, whole):
+    return float(part / whole * 100) if whole > 0 else 0
+
+
+def _mean(total, count, empty=np.nan):
+    return float(total / count) if count else empty
+
+
+def _under(seconds, limit, inclusive):
+    return seconds <= limit if inclusive else seconds < limit
+
+
+def _numbers(values):
+    return values.astype(str).str.strip()
+
+
+def compute_metrics(calls, returns=None, unreturned=None, inclusive=False, count_over_limit=True,
+                    wait_base="answered", returns_by="calls", returns_base=None,
+                    attempts_column="Total Chamadas", number_column="Destino Final"):
+    """
+    Every SLA of the received/missed calls (the recebidas output) and their
+    returns (the devolvidas output) in one grouped aggregation over the calls.
+
+    The defaults are metricas' definitions; the src1 SLA scripts pass their own:
+    inclusive counts calls ringing exactly 60s/20s as under the limit (<=);
+    count_over_limit=False leaves the calls that rang over 60s out of the answered
+    and missed counts, waits and durations (percentages stay over every received
+    call); wait_base="calls" averages wait and duration over every row of calls;
+    returns_by="numbers" counts distinct numbers (number_column of returns) in the
+    returned-within percentages, over returns_base ("calls" or "numbers"; the same
+    as returns_by by default). unreturned, the caller's own unreturned missed
+    calls, gives missed_not_returned_numbers by their Origem.
+    """
+    returns = pd.DataFrame() if returns is None else returns
+    if not set(DURATION_COLUMNS.values()) <= set(calls.columns):
+        calls = add_duration_seconds(calls)
+
+    kind = calls["Tipo"].astype(str).str.strip().str.lower()
+    wait = calls["Tempo de Espera (s)"].astype("int64")
+    duration = calls["Duração (s)"].astype("int64")
+    if attempts_column in calls.columns:
+        attempts = pd.to_numeric(calls[attempts_column], errors="coerce").astype("float64")
+    else:
+        attempts = pd.Series(np.nan, index=calls.index)
+    counted = _under(wait, 60, inclusive) | count_over_limit
+    per_kind = pd.DataFrame({
+        "kind": kind,
+        "counted": counted,
+        "wait": wait.where(counted, 0),
+        "duration": duration.where(counted, 0),
+        "under_60s": _under(wait, 60, inclusive),
+        "under_20s": _under(wait, 20, inclusive),
+        "first_attempt": attempts == 1,
+        "attempts": attempts,
+    }).groupby("kind").agg(
+        received=("counted", "size"),
+        calls=("counted", "sum"),
+        wait=("wait", "sum"),
+        duration=("duration", "sum"),
+        under_60s=("under_60s", "sum"),
+        under_20s=("under_20s", "sum"),
+        first_attempt=("first_attempt", "sum"),
+        numbers=("attempts", "count"),
+        attempts=("attempts", "sum"),
+    ).reindex([ANSWERED, MISSED], fill_value=0)
+    answered, missed = per_kind.loc[ANSWERED], per_kind.loc[MISSED]
+    total = int(answered["received"] + missed["received"])
+    if wait_base == "calls":
+        mean_wait, mean_duration = _mean(wait.sum(), len(calls)), _mean(duration.sum(), len(calls))
+    else:
+        mean_wait, mean_duration = _mean(answered["wait"], answered["calls"]), _mean(answered["duration"], answered["calls"])
+
+    delays = returns["Tempo até Devolução (s)"] if not returns.empty else pd.Series(dtype="float64")
+    returned_to = _numbers(returns[number_column]) if not returns.empty else pd.Series(dtype=object)
+    def within(seconds):
+        return returned_to[delays <= seconds].nunique() if returns_by == "numbers" else int((delays <= seconds).sum())
+
+    base = returned_to.nunique() if (returns_base or returns_by) == "numbers" else len(delays)
+    within_3min, within_15min = _pct(within(180), base), _pct(within(900), base)
+    return_duration = (
+        pd.to_timedelta(returns["Duração"], errors="coerce").dt.total_seconds().mean()
+        if not returns.empty and "Duração" in returns.columns else np.nan
+    )
+
+    missed_origins = calls.loc[(kind == MISSED) & counted, "Origem"]
+    if unreturned is not None:
+        missed_not_returned = _numbers(unreturned["Origem"]).nunique() if "Origem" in unreturned.columns else 0
+    elif returns.empty:
+        missed_not_returned = _numbers(missed_origins).nunique()
+    else:
+        returned_numbers = set(normalize_numbers(returns[number_column], "last9").unique())
+        missed_not_returned = len(set(normalize_numbers(missed_origins, "last9").unique()) - returned_numbers)
+
+    per_number = calls["Origem"].value_counts()
+    return CallMetrics(
+        total_calls=total,
+        answered=int(answered["calls"]),
+        missed=int(missed["calls"]),
+        answered_pct=_pct(answered["calls"], total),
+        missed_pct=_pct(missed["calls"], total),
+        answered_under_60s=int(answered["under_60s"]),
+        answered_under_20s=int(answered["under_20s"]),
+        answered_under_60s_pct=_pct(answered["under_60s"], answered["calls"]),
+        mean_wait_s=mean_wait,
+        mean_duration_s=mean_duration,
+        answered_first_attempt=int(answered["first_attempt"]),
+        answered_numbers=int(answered["numbers"]),
+        missed_numbers=int(missed["numbers"]),
+        mean_attempts_answered=_mean(answered["attempts"], answered["numbers"], 0),
+        mean_attempts_missed=_mean(missed["attempts"], missed["numbers"], 0),
+        missed_origins=_numbers(missed_origins).nunique(),
+        returned=len(returns),
+        returned_numbers=returned_to.nunique(),
+        returned_within_3min_pct=within_3min,
+        returned_within_15min_pct=within_15min,
+        mean_return_s=float(delays.mean()) if len(delays) else np.nan,
+        mean_return_duration_s=float(return_duration),
+        missed_not_returned_numbers=missed_not_returned,
+        all_calls=len(calls),
+        all_numbers=int(calls["Origem"].nunique()),
+        mean_calls_per_number=_mean((per_number ** 2).sum(), per_number.sum()),
+    )
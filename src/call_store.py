@@ -0,0 +1,297 @@
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import OUTPUT_DIR, DEVOLVIDAS_FILE, STORE_DIR
+from calls_counting import COUNT_WINDOW, count_calls_within_one_hour
+from call_dataset import day_range
+from data_filtering import CALL_TYPES, clean_calls, save_outputs
+from export_loader import in_date_range, load_export
+from number_normalization import normalize_numbers
+from profiling import profiled
+from return_calls import RETURN_WINDOW, match_returns
+from utils import first_outgoing_times, write_csv
+import call_db
+
+CALL_ID = "Identificador Global da Chamada"
+STORE_COLUMNS = ["Data Devolução", "ID Chamada Devolução"]
+INDEX_COLUMNS = [CALL_ID, "Tipo", "Data de Início", "Origem_norm"]
+
+# Layout of the store directory:
+#   legs-00001.pkl, ...    export rows of the analysed call types, one segment per
+#                          ingest, never rewritten
+#   index-00001.pkl, ...   id, Tipo, start and normalized Origem of each segment's legs,
+#                          so an ingest finds known ids and a number's unanswered calls
+#                          without opening the segments
+#   calls/2025-03.pkl, ... the cleaned calls with Total Chamadas and the return match,
+#                          one file per month of Data de Início; an ingest rewrites only
+#                          the months around the calls it changed
+#   first_outgoing.pkl     earliest outgoing time per number over all legs
+
+
+def _write(obj, path):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    pd.to_pickle(obj, tmp)
+    os.replace(tmp, path)
+
+
+def _segment(path):
+    return int(path.stem.split("-")[1])
+
+
+def _index(legs):
+    index = legs[INDEX_COLUMNS[:3]].assign(Origem_norm=normalize_numbers(legs["Origem"]))
+    index["Tipo"] = index["Tipo"].astype(str)
+    return index.reset_index(drop=True)
+
+
+def load_index(store_dir=STORE_DIR):
+    """The index of all stored legs, with the number of the segment holding each one"""
+    indexes = [pd.read_pickle(path).assign(segment=_segment(path)) for path in sorted(Path(store_dir).glob("index-*.pkl"))]
+    if not indexes:
+        return pd.DataFrame(columns=INDEX_COLUMNS + ["segment"])
+    return pd.concat(indexes, ignore_index=True)
+
+
+def load_first_outgoing(store_dir=STORE_DIR):
+    path = Path(store_dir) / "first_outgoing.pkl"
+    return pd.read_pickle(path) if path.exists() else pd.Series(dtype="datetime64[ns]")
+
+
+def load_stored_calls(store_dir=STORE_DIR, start=None, end=None):
+    """The stored calls of the months overlapping [start, end] (all of them by default)"""
+    files = sorted((Path(store_dir) / "calls").glob("*.pkl"))
+    if start is not None:
+        files = [f for f in files if f.stem >= f"{pd.Timestamp(start):%Y-%m}"]
+    if end is not None:
+        files = [f for f in files if f.stem <= f"{pd.Timestamp(end):%Y-%m}"]
+    if not files:
+        return pd.DataFrame()
+    return pd.concat([pd.read_pickle(f) for f in files], ignore_index=True)
+
+
+def _write_months(calls, months, store_dir):
+    """Rewrite the month files of `months` with the rows of calls started in them"""
+    calls_dir = Path(store_dir) / "calls"
+    calls_dir.mkdir(exist_ok=True)
+    month = calls["Data de Início"].dt.to_period("M")
+    for period in months:
+        path = calls_dir / f"{period}.pkl"
+        rows = calls[month == period]
+        if not rows.empty:
+            _write(rows.reset_index(drop=True), path)
+        elif path.exists():
+            path.unlink()
+
+
+def _migrate(store_dir):
+    """Index the segments and split calls.pkl by month in stores written before both existed"""
+    legacy = store_dir / "calls.pkl"
+    if not legacy.exists():
+        return
+    for segment in sorted(store_dir.glob("legs-*.pkl")):
+        index = store_dir / f"index-{_segment(segment):05d}.pkl"
+        if not index.exists():
+            _write(_index(pd.read_pickle(segment)), index)
+    calls = pd.read_pickle(legacy)
+    calls = calls[calls["Data de Início"].notna()]
+    if not calls.empty:
+        months = pd.period_range(calls["Data de Início"].min(), calls["Data de Início"].max(), freq="M")
+        _write_months(calls, months, store_dir)
+    legacy.unlink()
+
+
+def _recount(calls, changed):
+    """Refresh Total Chamadas for the origins and hour windows touched by changed rows"""
+    times = changed["Data de Início"].dropna()
+    if times.empty:
+        return
+    start, end = times.min(), times.max() + COUNT_WINDOW
+    context = calls[
+        calls["Origem"].isin(changed["Origem"]) &
+        calls["Data de Início"].between(start - COUNT_WINDOW, end)
+    ]
+    counted = count_calls_within_one_hour(context)
+    counts = pd.to_numeric(counted["Total Chamadas"], errors="coerce").astype("Int64")
+    counts.index = counted[CALL_ID]
+
+    # Rows before start only look back at unchanged rows
+    refresh = context.index[context["Data de Início"] >= start]
+    calls.loc[refresh, "Total Chamadas"] = calls.loc[refresh, CALL_ID].map(counts).astype("Int64")
+
+
+def _rematch_returns(calls, changed, until=None):
+    """
+    Redo the return match of the unanswered calls whose number or window was touched
+    (those started up to `until`; calls must hold every outgoing call RETURN_WINDOW after it)
+    """
+    times = changed["Data de Início"].dropna()
+    if times.empty:
+        return
+    start = times.min() - RETURN_WINDOW
+
+    # filter_returns matches on the outgoing call's Destino Final
+    returned_to = normalize_numbers(changed["Destino Final"])
+    numbers = set(changed.loc[changed["Tipo"] == "Chamada Não Atendida", "Origem_norm"])
+    numbers |= set(returned_to[changed["Tipo"] == "Chamada efetuada"])
+
+    recent = calls[calls["Data de Início"] >= start]
+    unanswered = recent[(recent["Tipo"] == "Chamada Não Atendida") & recent["Origem_norm"].isin(numbers)]
+    if until is not None:
+        unanswered = unanswered[unanswered["Data de Início"] <= until]
+    outgoing = recent[recent["Tipo"] == "Chamada efetuada"].copy()
+    outgoing["Destino_norm"] = normalize_numbers(outgoing["Destino Final"])
+    outgoing = outgoing[outgoing["Destino_norm"].isin(numbers)].sort_values("Data de Início", kind="stable")
+
+    calls.loc[unanswered.index, STORE_COLUMNS] = [pd.NaT, np.nan]
+    matches = match_returns(unanswered, outgoing)
+    if matches.empty:
+        return
+    matched = unanswered.index[matches["ordem"].to_numpy()]
+    returns = outgoing.iloc[matches["posicao"].astype(int)]
+    calls.loc[matched, "Data Devolução"] = returns["Data de Início"].to_numpy()
+    calls.loc[matched, "ID Chamada Devolução"] = returns[CALL_ID].to_numpy()
+
+
+@profiled()
+def ingest(input_file, store_dir=STORE_DIR):
+    """
+    Add an export to the store, skipping calls (global call ids) already in it.
+
+    Only the calls of the new ids, and of the older unanswered calls whose number
+    got an earlier first outgoing call, are cleaned again; retry counts and return
+    matches are then refreshed for the numbers and time windows those rows touch,
+    and only the month files around them are read and rewritten. Calls without a
+    start date are not stored. Returns (new export rows, (first, last)): the span
+    of the export's calls and of the stored calls it changed (None if empty).
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    _migrate(store_dir)
+    index = load_index(store_dir)
+    first_outgoing = load_first_outgoing(store_dir)
+
+    new = load_export(input_file)
+    new = new[new["Tipo"].isin(CALL_TYPES)]
+    span = new["Data de Início"].dropna()
+    new = new[~new[CALL_ID].isin(index[CALL_ID])].reset_index(drop=True)
+    if new.empty:
+        return 0, (span.min(), span.max()) if not span.empty else None
+
+    outgoing = new[new["Tipo"] == "Chamada efetuada"].assign(Destino_norm=normalize_numbers(new["Destino"]))
+    updated = pd.concat([first_outgoing, first_outgoing_times(outgoing)]).groupby(level=0).min()
+    moved = updated.index[~updated.eq(first_outgoing.reindex(updated.index))]
+
+    # Only the unanswered calls after the new first outgoing time are dropped now
+    earlier = index[(index["Tipo"] == "Chamada Não Atendida") & index["Origem_norm"].isin(moved)]
+    earlier = earlier[earlier["Data de Início"] > earlier["Origem_norm"].map(updated)]
+    segments = [pd.read_pickle(store_dir / f"legs-{n:05d}.pkl") for n in sorted(earlier["segment"].unique())]
+    legs = pd.concat(segments + [new], ignore_index=True)
+    affected_ids = set(new[CALL_ID]) | set(earlier[CALL_ID])
+
+    cleaned = clean_calls(legs[legs[CALL_ID].isin(affected_ids)], updated)
+    cleaned = cleaned[cleaned["Origem"].notna() & cleaned["Data de Início"].notna()]
+    cleaned["Total Chamadas"] = pd.array([pd.NA] * len(cleaned), dtype="Int64")
+    cleaned[STORE_COLUMNS[0]] = pd.NaT
+    cleaned[STORE_COLUMNS[1]] = pd.Series(np.nan, index=cleaned.index, dtype=object)
+
+    times = pd.concat([span, earlier["Data de Início"]]) if not earlier.empty else span
+    if not times.empty:
+        first, last = times.min(), times.max()
+        # Months holding the hour and return windows before, and the returns after
+        lo, hi = first - max(COUNT_WINDOW, RETURN_WINDOW), last + 2 * RETURN_WINDOW
+        calls = load_stored_calls(store_dir, lo, hi)
+        if calls.empty:
+            replaced = calls
+            calls = cleaned.reset_index(drop=True)
+        else:
+            replaced = calls[calls[CALL_ID].isin(affected_ids)]
+            calls = pd.concat([calls[~calls[CALL_ID].isin(affected_ids)], cleaned], ignore_index=True)
+
+        changed = pd.concat([replaced, cleaned])
+        _recount(calls, changed)
+        _rematch_returns(calls, changed, until=last + RETURN_WINDOW)
+        _write_months(calls, pd.period_range(lo, hi, freq="M"), store_dir)
+
+    # The index goes last: if it is lost, the rows are simply ingested again
+    _write(updated, store_dir / "first_outgoing.pkl")
+    segment = max((_segment(path) for path in store_dir.glob("legs-*.pkl")), default=0) + 1
+    _write(new, store_dir / f"legs-{segment:05d}.pkl")
+    _write(_index(new), store_dir / f"index-{segment:05d}.pkl")
+    return len(new), (first, last) if not times.empty else None
+
+
+def store_returns(calls, unanswered=None):
+    """
+    The devolvidas frame of the stored calls: the outgoing call matched to each
+    unanswered call (of `unanswered`, a subset of calls, if given)
+    """
+    unanswered = calls if unanswered is None else unanswered
+    returned = unanswered[unanswered["ID Chamada Devolução"].notna()]
+    if returned.empty:
+        return pd.DataFrame()
+    returns_df = calls.drop(columns=STORE_COLUMNS).set_index(CALL_ID, drop=False).loc[returned["ID Chamada Devolução"]]
+    returns_df["Destino_norm"] = normalize_numbers(returns_df["Destino Final"])
+    returns_df["Data Chamada Não Atendida"] = returned["Data de Início"].to_numpy()
+    returns_df["Tempo até Devolução (s)"] = (
+        returns_df["Data de Início"] - returns_df["Data Chamada Não Atendida"]
+    ).dt.total_seconds()
+    return returns_df.sort_values("Data de Início").reset_index(drop=True)
+
+
+@profiled()
+def save_store_outputs(calls, context=None):
+    """
+    Write the usual output files (cleaned, recebidas, devolvidas) from the stored calls
+    and return the (recebidas, devolvidas) frames; context, if given, is a superset of
+    calls holding their returns
+    """
+    df = calls.sort_values("Data de Início", ascending=False).reset_index(drop=True)
+    recebidas, _ = save_outputs(df.drop(columns=STORE_COLUMNS), returns=False)
+
+    returns_df = store_returns(df if context is None else context, df)
+    if not returns_df.empty:
+        write_csv(returns_df, DEVOLVIDAS_FILE)
+    return recebidas, returns_df
+
+
+def process_into_store(input_file_path, store_dir=STORE_DIR, db_file=None, start=None, end=None):
+    """
+    Ingest one or more exports into the store and write the outputs for the days
+    they cover (with the older calls they changed), or for the days from start to
+    end ('YYYY-MM-DD', end included) where given; with db_file, those calls are
+    also upserted into the SQLite database. Returns the (recebidas, devolvidas)
+    frames, or None on failure
+    """
+    input_files = input_file_path if isinstance(input_file_path, list) else [input_file_path]
+    try:
+        Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
+        spans = []
+        for input_file in input_files:
+            print(f"🚀 Iniciando processamento de: {input_file}")
+            added, span = ingest(input_file, store_dir)
+            print(f"🗄️ {added} linhas novas adicionadas ao arquivo de chamadas")
+            if span is not None:
+                spans.append(span)
+        if not spans:
+            print("⚠️ Nenhuma chamada com data nos arquivos.")
+            return None
+
+        first, last = min(s[0] for s in spans), max(s[1] for s in spans)
+        output_range = day_range(start, end)
+        if output_range is not None:
+            first = output_range[0] if output_range[0] is not None else first
+            last = output_range[1] if output_range[1] is not None else last
+        print(f"📅 Saídas de {first:%Y-%m-%d} a {last:%Y-%m-%d}")
+        calls = load_stored_calls(store_dir, first, last + RETURN_WINDOW)
+        selected = calls[in_date_range(calls["Data de Início"], first, last)] if not calls.empty else calls
+        if selected.empty:
+            print("⚠️ Arquivo de chamadas vazio.")
+            return None
+        if db_file is not None:
+            print(f"🗄️ {call_db.save_calls(calls, db_file)} chamadas guardadas em: {db_file}")
+        return save_store_outputs(selected, calls)
+
+    except Exception as e:
+        print(f"❌ Error processing file {input_file_path}: {str(e)}")
+        return None
@@ -1,33 +1,55 @@
-from datetime import timedelta
+import numpy as np
 import pandas as pd
-
-def count_calls_within_one_hour(group):
-   # group['Data de Início'] = pd.to_datetime(group['Data de Início'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-    group['Data de Início'] = pd.to_datetime(
-    group['Data de Início'],
-    format='%d/%m/%y %H:%M',
-    errors='coerce'
-)
-
-    group = group.sort_values('Data de Início').reset_index(drop=True)
-    group['Total Chamadas'] = pd.NA
-
-    filtered_group = group[group['Tipo'].str.strip().str.lower() != 'chamada efetuada']
-
-    for idx in filtered_group.index:
-        call_time = group.loc[idx, 'Data de Início']
-
-        janela_inicio = call_time - timedelta(hours=1)
-        same_origin_mask = (
-            (group['Origem'] == group.loc[idx, 'Origem']) &
-            (group['Tipo'].str.strip().str.lower() != 'chamada efetuada') &
-            (group['Data de Início'] >= janela_inicio) &
-            (group['Data de Início'] <= call_time)
-        )
-
-        total_chamadas = same_origin_mask.sum()
-
-        if total_chamadas > 0:
-            group.loc[idx, 'Total Chamadas'] = total_chamadas
-
-    return group
+from profiling import profiled
+
+# Janela das tentativas: chamadas da mesma Origem nesta janela contam juntas
+COUNT_WINDOW = pd.Timedelta(hours=1)
+
+@profiled()
+def count_calls_within_one_hour(df):
+    """
+    Conta, para cada chamada não efetuada, quantas chamadas não efetuadas da
+    mesma Origem ocorreram na hora anterior (inclusive) e guarda em 'Total Chamadas'.
+
+    Todas as origens são tratadas numa só passagem: as chamadas são ordenadas por
+    (Origem, Data de Início) e os limites de cada janela são obtidos por pesquisa
+    binária, em O(n log n).
+    """
+    df = df.copy()
+    df['Data de Início'] = pd.to_datetime(
+        df['Data de Início'],
+        format='%d/%m/%y %H:%M',
+        errors='coerce'
+    )
+
+    # Mesma ordem que groupby("Origem").apply: origens ordenadas, datas crescentes
+    df = df[df['Origem'].notna()]
+    df = df.sort_values(['Origem', 'Data de Início'], kind='stable').reset_index(drop=True)
+    df['Total Chamadas'] = pd.NA
+
+    elegiveis = (
+        (df['Tipo'].str.strip().str.lower() != 'chamada efetuada') &
+        df['Data de Início'].notna()
+    ).to_numpy()
+    if not elegiveis.any():
+        return df
+
+    origem_codes = pd.factorize(df['Origem'])[0][elegiveis].astype(np.int64)
+    tempos = df['Data de Início'].to_numpy()[elegiveis].astype('datetime64[ns]').astype(np.int64)
+    janela = COUNT_WINDOW.value
+
+    # Tempos substituídos pela sua posição na lista ordenada de todos os tempos:
+    # preserva a ordem e cabe numa chave composta (origem, tempo) em int64.
+    tempos_ordenados = np.sort(tempos)
+    rank_fim = np.searchsorted(tempos_ordenados, tempos, side='left')
+    rank_inicio = np.searchsorted(tempos_ordenados, tempos - janela, side='left')
+
+    base = origem_codes * (len(tempos) + 1)
+    chaves = np.sort(base + rank_fim)
+    total_chamadas = (
+        np.searchsorted(chaves, base + rank_fim, side='right') -
+        np.searchsorted(chaves, base + rank_inicio, side='left')
+    )
+
+    df.loc[elegiveis, 'Total Chamadas'] = total_chamadas
+    return df
@@ -10,3 +10,8 @@ OUTPUT_DIR = BASE_DIR / "output"
 CLEAN_OUTPUT_FILE = OUTPUT_DIR / "cleaned.csv"
 RECEBIDAS_FILE = OUTPUT_DIR / "recebidas.csv"
 DEVOLVIDAS_FILE = OUTPUT_DIR / "devolvidas.csv"
+CACHE_DIR = BASE_DIR / "cache"
+STORE_DIR = BASE_DIR / "store"
+CALL_DB_FILE = STORE_DIR / "calls.sqlite"
+DATASET_DIR = BASE_DIR / "dataset"
+CUBE_FILE = BASE_DIR / "cube" / "sla_cube.parquet"
@@ -1,92 +1,223 @@
 import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from config import OUTPUT_DIR, CLEAN_OUTPUT_FILE, RECEBIDAS_FILE
-from calls_counting import count_calls_within_one_hour
-from return_calls import filter_returns
-from utils import normalize_number
+from calls_counting import COUNT_WINDOW, count_calls_within_one_hour
+from return_calls import RETURN_WINDOW, filter_returns
+from utils import first_outgoing_times, write_csv
+from number_normalization import normalize_numbers
+from profiling import profiled
+from durations import add_duration_seconds
+from export_loader import DATE_COLUMNS, EXPORT_SCHEMA, load_export, load_export_cached, in_date_range
+from call_dataset import day_range, load_calls, load_dataset
+import call_db
 
-def remove_unanswered_after_received(df):
-    """Remove unanswered calls that were preceded by outgoing calls to same number"""
+CALL_TYPES = ["Chamada recebida", "Chamada Não Atendida", "Chamada efetuada"]
+BLOCKED_ORIGINS = ['Anónimo', '+351938116613', '+351915942292', '+351935991897']
+BLOCKED_DESTINATIONS = ['+351234246184', '90', '80', '401', '+351234246186', '+351234246185', '+351234246184' ]
+
+# Blocked rows still count for remove_unanswered_after_received and for the
+# duplicate check on the global call id, so streaming keeps these columns of them
+BLOCKED_KEY_COLUMNS = ["Tipo", "Data de Início", "Origem", "Destino", "Identificador Global da Chamada"]
+# All remove_unanswered_after_received needs from the calls before a date range
+OUTGOING_COLUMNS = ["Tipo", "Data de Início", "Destino"]
+
+def is_blocked(df):
+    """Rows from blocked origins or to blocked destinations (test numbers, internal lines)"""
+    return df["Origem"].isin(BLOCKED_ORIGINS) | df["Destino"].isin(BLOCKED_DESTINATIONS)
+
+def remove_unanswered_after_received(df, first_outgoing=None):
+    """
+    Remove unanswered calls that were preceded by outgoing calls to same number.
+    first_outgoing (number -> earliest outgoing time) defaults to the one of df itself.
+    """
     df = df.copy()
-    df["Data de Início"] = pd.to_datetime(df["Data de Início"], errors="coerce")
-    df["Origem_norm"] = df["Origem"].apply(normalize_number)
-    df["Destino_norm"] = df["Destino"].apply(normalize_number)
+    df["Origem_norm"] = normalize_numbers(df["Origem"])
+    df["Destino_norm"] = normalize_numbers(df["Destino"])
+
+    if first_outgoing is None:
+        first_outgoing = first_outgoing_times(df[df["Tipo"] == "Chamada efetuada"])
+    previous_outgoing = df["Origem_norm"].map(first_outgoing) < df["Data de Início"]
+
+    return df[~((df["Tipo"] == "Chamada Não Atendida") & previous_outgoing)].reset_index(drop=True)
+
+def load_filtered_chunks(input_file_path, chunksize, date_range=None):
+    """
+    Stream the export in chunks, keeping only CALL_TYPES rows. Blocked rows are
+    cut down to BLOCKED_KEY_COLUMNS, so memory follows the filtered size.
+    """
+    kept = []
+    for chunk in load_export(input_file_path, chunksize=chunksize, date_range=date_range):
+        chunk = chunk[chunk["Tipo"].isin(CALL_TYPES)].copy()
+        chunk["Origem"] = chunk["Origem"].str.strip()
+        chunk["Destino"] = chunk["Destino"].str.strip()
+
+        blocked = is_blocked(chunk)
+        kept.append(chunk[~blocked])
+        kept.append(chunk.loc[blocked, BLOCKED_KEY_COLUMNS])
+
+    df = pd.concat(kept).sort_index(kind="stable").reset_index(drop=True)
+    df["Tipo"] = df["Tipo"].astype("category")
+    return df
+
+@profiled()
+def clean_calls(df, first_outgoing=None):
+    """
+    Keep one row per global call id of the analysed call types, without blocked
+    numbers or unanswered calls already followed up, plus the duration seconds
+    """
+    df = remove_unanswered_after_received(df, first_outgoing)
+
+    df = df[df["Tipo"].isin(CALL_TYPES)]
+    df = df.drop_duplicates(subset="Identificador Global da Chamada").reset_index(drop=True)
+
+    df["Origem"] = df["Origem"].str.strip()
+    df["Destino"] = df["Destino"].str.strip()
+    df = df[~is_blocked(df)]
+    return add_duration_seconds(df)
+
+@profiled()
+def save_outputs(df, returns=True):
+    """
+    Write cleaned.csv and recebidas.csv (and devolvidas.csv via filter_returns).
+    Returns the (recebidas, devolvidas) frames; devolvidas is None without returns.
+    """
+    write_csv(df, CLEAN_OUTPUT_FILE)
+
+    # Process returned calls
+    returns_df = filter_returns(df, OUTPUT_DIR) if returns else None
+
+    # Save received/missed calls
+    na_recebidas_df = df[df["Tipo"].isin(["Chamada Não Atendida", "Chamada recebida"])]
+    write_csv(na_recebidas_df, RECEBIDAS_FILE)
+
+    print(f"📁 Guardado em: {RECEBIDAS_FILE}")
+    print(f"📁 Ficheiros existentes no output: {list(Path(OUTPUT_DIR).glob('*'))}")
+    return na_recebidas_df, returns_df
 
-    unanswered = df[df["Tipo"] == "Chamada Não Atendida"]
-    outgoing = df[df["Tipo"] == "Chamada efetuada"]
+def load_input(input_file_path, chunksize=None, use_cache=True, date_range=None):
+    """
+    Parse one export, streamed (chunksize), from the cache or straight from the CSV;
+    a directory is read as the month-partitioned dataset (call_dataset). With
+    date_range=(start, end), only the calls started within it are kept.
+    """
+    if Path(input_file_path).is_dir():
+        return load_dataset(input_file_path, date_range)
+    if chunksize:
+        return load_filtered_chunks(input_file_path, chunksize, date_range)
+    if use_cache:
+        df = load_export_cached(input_file_path)
+        if date_range is not None:
+            df = df[in_date_range(df["Data de Início"], *date_range)].reset_index(drop=True)
+        return df
+    return load_export(input_file_path, date_range=date_range)
+
+@profiled()
+def load_inputs(input_files, chunksize=None, use_cache=True, workers=None, date_range=None):
+    """
+    Parse several exports in parallel (one process per file) and merge them in the
+    given order. Exports overlap, so rows of a global call id already seen (as one
+    of CALL_TYPES, like the call store) in an earlier file are dropped.
+    """
+    load = partial(load_input, chunksize=chunksize, use_cache=use_cache, date_range=date_range)
+    if len(input_files) == 1:
+        return load(input_files[0])
 
-    indices_to_remove = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(load, input_files))
 
-    for idx, na_call in unanswered.iterrows():
-        na_origin = na_call["Origem_norm"]
-        na_time = na_call["Data de Início"]
+    seen = set()
+    merged = []
+    for df in frames:
+        ids = df["Identificador Global da Chamada"]
+        merged.append(df[~ids.isin(seen)])
+        seen.update(ids[df["Tipo"].isin(CALL_TYPES)].dropna())
 
-        previous_outgoing = outgoing[
-            (outgoing["Destino_norm"] == na_origin) &
-            (outgoing["Data de Início"] < na_time)
-        ]
+    df = pd.concat(merged, ignore_index=True)
+    df["Tipo"] = df["Tipo"].astype("category")
+    print(f"📚 {len(input_files)} ficheiros juntos: {sum(map(len, frames))} linhas, {len(df)} após remover sobreposições")
+    return df
 
-        if not previous_outgoing.empty:
-            indices_to_remove.add(idx)
+def load_outgoing(input_file_path, until=None, use_cache=True):
+    """Outgoing calls (OUTGOING_COLUMNS) of one export or dataset started up to until"""
+    if use_cache and not Path(input_file_path).is_dir():
+        df = load_export_cached(input_file_path)[OUTGOING_COLUMNS]
+        df = df[in_date_range(df["Data de Início"], end=until)]
+    else:
+        drop_columns = [col for col in [*EXPORT_SCHEMA, *DATE_COLUMNS] if col not in OUTGOING_COLUMNS]
+        df = load_calls(input_file_path, (None, until), drop_columns=drop_columns)
+    return df[df["Tipo"] == "Chamada efetuada"]
 
-    return df.drop(index=indices_to_remove).reset_index(drop=True)
+@profiled()
+def first_outgoing_until(input_files, until=None, use_cache=True, workers=None):
+    """
+    Earliest outgoing call per normalized Destino over the whole exports up to until,
+    as remove_unanswered_after_received computes it on a full run. Only the
+    OUTGOING_COLUMNS are read, so a date range keeps the history before its start.
+    """
+    load = partial(load_outgoing, until=until, use_cache=use_cache)
+    if len(input_files) == 1:
+        frames = [load(input_files[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(load, input_files))
+    outgoing = pd.concat(frames, ignore_index=True)
+    outgoing["Destino_norm"] = normalize_numbers(outgoing["Destino"])
+    return first_outgoing_times(outgoing)
 
-def process_and_clean_input(input_file_path):
+@profiled()
+def process_and_clean_input(input_file_path, chunksize=None, use_cache=True, workers=None, db_file=None, start=None, end=None):
     """
     Process input CSV file and generate cleaned outputs
     Args:
-        input_file_path (str/Path): Path to the input CSV file
+        input_file_path (str/Path or list): Path to the input CSV file, or several
+            exports to merge into one analysis
+        chunksize (int): If given, stream the export in chunks of this many rows
+        use_cache (bool): Reuse the parsed export from the cache when unchanged (ignored with chunksize)
+        workers (int): Processes used to parse several exports (default: one per CPU)
+        db_file (str/Path): If given, also upsert the cleaned calls into this SQLite database
+        start, end (str): Only analyse the calls started in these days ('YYYY-MM-DD', end
+            included); outgoing calls up to RETURN_WINDOW later are read too, for the returns,
+            and calls from COUNT_WINDOW earlier, for the retry counts
+    Returns:
+        The (recebidas, devolvidas) frames written to the output, or None on failure
     """
+    input_files = input_file_path if isinstance(input_file_path, (list, tuple)) else [input_file_path]
     try:
-        print(f"🚀 Iniciando processamento de: {input_file_path}")
+        print(f"🚀 Iniciando processamento de: {', '.join(map(str, input_files))}")
 
         Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
         
-        df = pd.read_csv(input_file_path, delimiter=";", skiprows=2)
-        df = remove_unanswered_after_received(df)
-        
-        df = df[df["Tipo"].isin(["Chamada recebida", "Chamada Não Atendida", "Chamada efetuada"])]
-        df = df.drop_duplicates(subset="Identificador Global da Chamada").reset_index(drop=True)
-
-        unnecessary_columns = [
-            "Utilizador", "Telefone de Origem", "Número de Páginas do Fax", "Tipo de Telefone",
-            "Contexto de Acesso da Chamada", "Tipo de localização", "Serviço",
-            "Tempo da Fila de Espera", "País", "Identificação de chamada reencaminhada",
-            "Percurso no Grupo de Atendimento", "Tipo de Encaminhamento"
-        ]
-        df = df.drop(columns=[col for col in unnecessary_columns if col in df.columns], errors='ignore')
-        
-        df["Data de Início"] = pd.to_datetime(df["Data de Início"], errors="coerce")
-        
-        blocked_origins = ['Anónimo', '+351938116613', '+351915942292', '+351935991897']
-        blocked_destinations = ['+351234246184', '90', '80', '401', '+351234246186', '+351234246185', '+351234246184' ]
-        df["Origem"] = df["Origem"].str.strip().str.replace("'", "")
-        df["Destino"] = df["Destino"].str.strip().str.replace("'", "")
-        df = df[~df["Origem"].isin(blocked_origins)]
-        df = df[~df["Destino"].isin(blocked_destinations)]
+        first, until = day_range(start, end) or (None, None)
+        date_range = None
+        first_outgoing = None
+        if first is not None:
+            # Unanswered calls already followed up are dropped by the first outgoing
+            # call ever made to the number, which may come before start
+            first_outgoing = first_outgoing_until(input_files, until, use_cache=use_cache and not chunksize, workers=workers)
+            date_range = (first - COUNT_WINDOW, None)
+        if until is not None:
+            date_range = (date_range[0] if date_range else None, until + RETURN_WINDOW)
+        df = load_inputs(input_files, chunksize=chunksize, use_cache=use_cache, workers=workers, date_range=date_range)
+        df = clean_calls(df, first_outgoing)
+        if db_file is not None:
+            print(f"🗄️ {call_db.save_calls(df, db_file)} chamadas guardadas em: {db_file}")
 
         # Count calls and save outputs
-        df = df.groupby("Origem", group_keys=False).apply(count_calls_within_one_hour)
+        df = count_calls_within_one_hour(df)
         df["Total Chamadas"] = pd.to_numeric(df["Total Chamadas"], errors="coerce").astype("Int64")
         df = df.sort_values("Data de Início", ascending=False).reset_index(drop=True)
+        if first is not None:
+            # The calls before start only counted towards the retries of those after it
+            df = df[df["Data de Início"] >= first].reset_index(drop=True)
+        if until is not None:
+            # After end, only the outgoing calls that may return a missed call are kept
+            df = df[(df["Data de Início"] <= until) | (df["Tipo"] == "Chamada efetuada")].reset_index(drop=True)
         
-        # Save cleaned data
-        df.to_csv(CLEAN_OUTPUT_FILE, index=False, sep=";")
-       
-        # Process returned calls
-        filter_returns(df, OUTPUT_DIR)
-
-        # Save received/missed calls
-        na_recebidas_df = df[df["Tipo"].isin(["Chamada Não Atendida", "Chamada recebida"])]
-        na_recebidas_path = "recebidas.csv"
-        na_recebidas_df.to_csv(RECEBIDAS_FILE, index=False, sep=";")
-
-        print(f"📁 Guardado em: {RECEBIDAS_FILE}")
-        print(f"📁 Ficheiros existentes no output: {list(Path(OUTPUT_DIR).glob('*'))}")
-
-        return True
+        return save_outputs(df)
         
     except Exception as e:
         print(f"❌ Error processing file {input_file_path}: {str(e)}")
-        return False
\ No newline at end of file
+        return None
\ No newline at end of file
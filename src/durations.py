@@ -0,0 +1,50 @@
+import re
+import numpy as np
+import pandas as pd
+
+DURATION_PATTERN = r"^(?:(\d+):)?(\d+):(\d+)$"
+DURATION_COLUMNS = {"Tempo de Toque": "Tempo de Espera (s)", "Duração": "Duração (s)"}
+# Helper columns for the in-memory stages; write_csv leaves them out of the outputs
+SECONDS_COLUMNS = list(DURATION_COLUMNS.values())
+
+
+def parse_durations(durations):
+    """
+    'H:MM:SS' or 'MM:SS' -> int32 seconds; anything else becomes 0.
+    Timedeltas (src1 parses the durations itself) are converted as they are.
+
+    Only the distinct values are parsed, since the same few durations repeat
+    across the whole export.
+    """
+    if pd.api.types.is_timedelta64_dtype(durations):
+        return durations.dt.total_seconds().fillna(0).astype(np.int32)
+    codes, uniques = pd.factorize(durations)
+    parts = (
+        pd.Series(uniques, dtype=object).astype(str).str.strip()
+        .str.extract(DURATION_PATTERN)
+        .astype(float)
+    )
+    seconds = (
+        parts[0].fillna(0) * 3600 + parts[1] * 60 + parts[2]
+    ).fillna(0).to_numpy(dtype=np.int32)
+
+    values = np.append(seconds, np.int32(0))
+    return pd.Series(values[codes], index=durations.index)
+
+
+def duration_seconds(duration):
+    """parse_durations() for a single value"""
+    match = re.match(DURATION_PATTERN, str(duration).strip())
+    if match is None:
+        return 0
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def add_duration_seconds(df):
+    """Copy of df with 'Tempo de Toque' and 'Duração' parsed once into their '(s)' columns"""
+    return df.assign(**{
+        seconds_column: parse_durations(df[column])
+        for column, seconds_column in DURATION_COLUMNS.items()
+        if column in df.columns
+    })
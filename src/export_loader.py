@@ -0,0 +1,180 @@
+import glob
+import hashlib
+import os
+from pathlib import Path
+import pandas as pd
+from config import CACHE_DIR
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # without pyarrow there is no cache, every run parses the CSV
+    feather = None
+
+# Bump whenever the schema or the parsing below changes, so cached frames are re-parsed
+SCHEMA_VERSION = 1
+
+# Global Connect "Todas as Chamadas" export: two title lines, then the header
+EXPORT_SKIPROWS = 2
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_COLUMNS = ["Data de Início", "Data de Fim"]
+# Rows per chunk when reading only a date range
+DATE_RANGE_CHUNKSIZE = 50_000
+
+# Numbers and identifiers come wrapped in single quotes ('+351912345678', '0000...').
+# They are always read as text, so leading zeros and '+' prefixes survive; with
+# unquote=True the parser itself also strips the quotes (quotechar="'").
+EXPORT_SCHEMA = {
+    "Tipo": "category",
+    "Utilizador": str,
+    "Tempo de Toque": str,
+    "Duração": str,
+    "Fuso Horário": str,
+    "Origem": str,
+    "Destino": str,
+    "Destino Final": str,
+    "Serviço": str,
+    "Número de Páginas do Fax": str,
+    "Telefone de Origem": str,
+    "Tipo de localização": str,
+    "Tipo de Encaminhamento": str,
+    "Atendida": str,
+    "Percurso no Grupo de Atendimento": str,
+    "Tempo da Fila de Espera": str,
+    "Tipo de Telefone": str,
+    "Contexto de Acesso da Chamada": str,
+    "Identificação Chamada": str,
+    "Identificador Global da Chamada": str,
+    "Identificação de chamada reencaminhada": str,
+    "País": str,
+    "Chamada gravada": str,
+    "Causa de Não Atendimento": str,
+}
+
+# Columns the export wraps in single quotes. The outputs of main.py keep those
+# quotes, except on Origem and Destino, which it has always written bare; a bare
+# 38-digit id or phone number is mangled by Excel.
+QUOTED_COLUMNS = [
+    "Fuso Horário", "Origem", "Destino", "Destino Final", "Telefone de Origem",
+    "Percurso no Grupo de Atendimento", "Identificação Chamada",
+    "Identificador Global da Chamada", "Identificação de chamada reencaminhada",
+]
+OUTPUT_QUOTED_COLUMNS = [col for col in QUOTED_COLUMNS if col not in ("Origem", "Destino")]
+
+# Columns none of the src pipelines read
+UNUSED_COLUMNS = [
+    "Utilizador", "Telefone de Origem", "Número de Páginas do Fax", "Tipo de Telefone",
+    "Contexto de Acesso da Chamada", "Tipo de localização", "Serviço",
+    "Tempo da Fila de Espera", "País", "Identificação de chamada reencaminhada",
+    "Percurso no Grupo de Atendimento", "Tipo de Encaminhamento"
+]
+
+
+def _parse_dates(df):
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, errors="coerce")
+    return df
+
+
+def in_date_range(dates, start=None, end=None):
+    """Boolean mask of dates within [start, end] (either bound may be None); NaT is outside"""
+    mask = dates.notna()
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start)
+    if end is not None:
+        mask &= dates <= pd.Timestamp(end)
+    return mask
+
+
+def _prune_chunks(chunks, start, end):
+    """
+    Keep the rows of each parsed chunk started within [start, end]. Exports are
+    written newest first: while that holds, reading stops at the first chunk
+    that ends before start, since nothing after it can be in range.
+    """
+    newest_first = True
+    previous = None
+    for chunk in chunks:
+        dates = chunk["Data de Início"]
+        valid = dates.dropna()
+        if len(valid):
+            newest_first = newest_first and valid.is_monotonic_decreasing and (previous is None or previous >= valid.iloc[0])
+            previous = valid.iloc[-1]
+        yield chunk[in_date_range(dates, start, end)]
+        if newest_first and start is not None and previous is not None and previous < pd.Timestamp(start):
+            return
+
+
+def load_export(input_file, drop_columns=UNUSED_COLUMNS, unquote=True, chunksize=None, date_range=None):
+    """
+    Read a calls export with the declared schema: unused columns are never
+    parsed, Tipo is categorical and the date columns are parsed once with
+    the export's fixed format (invalid dates become NaT).
+
+    With chunksize, returns an iterator of parsed chunks instead of one frame.
+    With date_range=(start, end), only rows started within it are kept, chunk
+    by chunk as they are read (see _prune_chunks), so memory and the later
+    stages follow the size of the range rather than of the export.
+    """
+    drop_columns = set(drop_columns)
+    reader = pd.read_csv(
+        input_file,
+        delimiter=";",
+        skiprows=EXPORT_SKIPROWS,
+        quotechar="'" if unquote else '"',
+        usecols=lambda col: col not in drop_columns,
+        dtype=EXPORT_SCHEMA,
+        chunksize=chunksize or (DATE_RANGE_CHUNKSIZE if date_range else None),
+    )
+    if date_range:
+        chunks = _prune_chunks((_parse_dates(chunk) for chunk in reader), *date_range)
+        if chunksize:
+            return chunks
+        df = pd.concat(chunks, ignore_index=True)
+        df["Tipo"] = df["Tipo"].astype("category")
+        return df
+    if chunksize is None:
+        return _parse_dates(reader)
+    return (_parse_dates(chunk) for chunk in reader)
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_export_cached(input_file, drop_columns=UNUSED_COLUMNS, unquote=True, cache_dir=CACHE_DIR):
+    """
+    load_export() backed by an on-disk Arrow (Feather) copy of the parsed frame.
+
+    Entries are keyed by the export's path and content hash, SCHEMA_VERSION and
+    the loader options. A hit skips the CSV parse, but it is not zero-copy: the
+    file is memory-mapped and then converted to the same object-dtype frame
+    load_export() gives, which the pipelines rely on. Writing an entry removes
+    the older ones for the same export path (other content or schema version).
+    """
+    if feather is None:
+        return load_export(input_file, drop_columns, unquote)
+
+    cache_dir = Path(cache_dir)
+    options = hashlib.sha256(repr((sorted(drop_columns), unquote)).encode()).hexdigest()[:8]
+    path_hash = hashlib.sha256(str(Path(input_file).resolve()).encode()).hexdigest()[:8]
+    prefix = f"{Path(input_file).name}.{path_hash}.v"
+    entry = cache_dir / f"{prefix}{SCHEMA_VERSION}.{options}.{_file_digest(input_file)[:16]}.feather"
+    if entry.exists():
+        return feather.read_table(entry, memory_map=True).to_pandas()
+
+    df = load_export(input_file, drop_columns, unquote)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for stale in cache_dir.glob(f"{glob.escape(prefix)}*.feather"):
+        version, stale_options = stale.name[len(prefix):].split(".")[:2]
+        if version != str(SCHEMA_VERSION) or stale_options == options:
+            stale.unlink(missing_ok=True)
+    tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+    feather.write_feather(df, tmp, compression="uncompressed")
+    os.replace(tmp, entry)
+    return df
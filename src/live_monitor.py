@@ -0,0 +1,356 @@
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta
+from data_filtering import BLOCKED_ORIGINS, BLOCKED_DESTINATIONS, CALL_TYPES
+from durations import duration_seconds
+from export_loader import DATE_FORMAT
+from number_normalization import normalize_number
+from profiling import LOG_DIR
+from return_calls import RETURN_WINDOW
+
+CALL_ID = "Identificador Global da Chamada"
+ATTEMPT_WINDOW = timedelta(hours=1)   # same as count_calls_within_one_hour
+ID_MEMORY = timedelta(days=1)         # forwarded legs of a call share its global id
+CALLED_MEMORY = timedelta(days=90)    # numbers not called for this long count as never called
+SNAPSHOT_FILE = LOG_DIR / "live_snapshot.json"
+WINDOW_LABELS = {"last_hour": "última hora", "today": "hoje"}
+
+
+class _Call:
+    """A received or missed call inside the windows"""
+    __slots__ = ("time", "origin", "answered", "wait", "attempts", "returned", "dropped")
+
+    def __init__(self, time, origin, answered, wait, attempts):
+        self.time = time
+        self.origin = origin
+        self.answered = answered
+        self.wait = wait
+        self.attempts = attempts
+        self.returned = False
+        self.dropped = False   # replaced by a later leg with the same global id
+
+
+class Window:
+    """
+    Running KPI sums over the calls from start_of(now) on. Calls enter and leave
+    once, so every update is O(1) amortized whatever the window length.
+    """
+
+    def __init__(self, name, start_of):
+        self.name = name
+        self.start_of = start_of
+        self.start = None
+        self.calls = deque()
+        self.answered = self.missed = 0
+        self.under_60s = self.wait = 0
+        self.attempts_answered = self.attempts_missed = 0
+        self.pending = 0
+
+    def _apply(self, call, sign):
+        if call.answered:
+            self.answered += sign
+            self.under_60s += sign * (call.wait < 60)
+            self.wait += sign * call.wait
+            self.attempts_answered += sign * call.attempts
+        else:
+            self.missed += sign
+            self.attempts_missed += sign * call.attempts
+            self.pending += sign * (not call.returned)
+
+    def advance(self, now):
+        self.start = self.start_of(now)
+        while self.calls and self.calls[0].time < self.start:
+            call = self.calls.popleft()
+            if not call.dropped:
+                self._apply(call, -1)
+
+    def add(self, call):
+        # The feed is expected in time order; a late row older than the window is left out
+        if call.time >= self.start:
+            self.calls.append(call)
+            self._apply(call, 1)
+
+    def retract(self, call):
+        if call.time >= self.start:
+            self._apply(call, -1)
+
+    def mark_returned(self, call):
+        if call.time >= self.start:
+            self.pending -= 1
+
+    def snapshot(self):
+        total = self.answered + self.missed
+        return {
+            "since": self.start.isoformat(sep=" ") if self.start else None,
+            "calls": total,
+            "answered": self.answered,
+            "missed": self.missed,
+            "answered_pct": round(self.answered / total * 100, 2) if total else 0,
+            "answered_under_60s": self.under_60s,
+            "answered_under_60s_pct": round(self.under_60s / self.answered * 100, 2) if self.answered else 0,
+            "mean_wait_s": round(self.wait / self.answered, 2) if self.answered else None,
+            "pending_unreturned": self.pending,
+            "mean_attempts_answered": round(self.attempts_answered / self.answered, 2) if self.answered else None,
+            "mean_attempts_missed": round(self.attempts_missed / self.missed, 2) if self.missed else None,
+        }
+
+
+def default_windows():
+    return [
+        Window("last_hour", lambda now: now - timedelta(hours=1)),
+        Window("today", lambda now: now.replace(hour=0, minute=0, second=0, microsecond=0)),
+    ]
+
+
+class LiveMonitor:
+    """
+    The analisar_chamadas KPIs kept up to date one export row at a time.
+
+    Rows go through the same rules as clean_calls and filter_returns: one row per
+    global call id, no blocked numbers, missed calls from numbers already called
+    (in the last CALLED_MEMORY) dropped, attempts counted over the caller's last
+    hour, and a missed call stays pending until an outgoing call reaches its
+    number within RETURN_WINDOW. Time is the feed's own (Data de Início of the
+    newest row), so a replayed log gives the same figures as a live one; state
+    older than those windows is let go, so memory stays flat on a long run.
+    """
+
+    def __init__(self, windows=None):
+        self.windows = windows or default_windows()
+        self.now = None
+        self.rows = 0
+        self.calls_by_id = {}                 # global id -> its counted call (None if not counted)
+        self.id_times = deque()
+        self.recent_by_origin = defaultdict(deque)
+        self.recent_times = deque()           # (time, origin), to evict origins idle for ATTEMPT_WINDOW
+        self.called_numbers = OrderedDict()   # number -> last outgoing call to it, oldest first
+        self.pending = defaultdict(deque)     # number -> its unreturned missed calls
+        self.pending_times = deque()          # (time, number), to expire after RETURN_WINDOW
+
+    def _advance(self, when):
+        if self.now is not None and when <= self.now:
+            return
+        self.now = when
+        for window in self.windows:
+            window.advance(when)
+
+        while self.id_times and self.id_times[0][0] < when - ID_MEMORY:
+            self.calls_by_id.pop(self.id_times.popleft()[1], None)
+        while self.called_numbers and next(iter(self.called_numbers.values())) < when - CALLED_MEMORY:
+            self.called_numbers.popitem(last=False)
+        cutoff = when - ATTEMPT_WINDOW
+        while self.recent_times and self.recent_times[0][0] < cutoff:
+            origin = self.recent_times.popleft()[1]
+            recent = self.recent_by_origin.get(origin)
+            while recent and recent[0] < cutoff:
+                recent.popleft()
+            if recent is not None and not recent:
+                del self.recent_by_origin[origin]
+        cutoff = when - RETURN_WINDOW
+        while self.pending_times and self.pending_times[0][0] < cutoff:
+            number = self.pending_times.popleft()[1]
+            calls = self.pending.get(number)
+            while calls and calls[0].time < cutoff:
+                calls.popleft()
+            if calls is not None and not calls:
+                del self.pending[number]
+
+    def _returned(self, number, when):
+        calls = self.pending.get(number)
+        while calls and calls[0].time < when:
+            call = calls.popleft()
+            if call.dropped:
+                continue
+            call.returned = True
+            for window in self.windows:
+                window.mark_returned(call)
+        if calls is not None and not calls:
+            del self.pending[number]
+
+    def _drop(self, call):
+        call.dropped = True
+        for window in self.windows:
+            window.retract(call)
+        recent = self.recent_by_origin.get(call.origin)
+        if recent and call.time in recent:
+            recent.remove(call.time)
+
+    def feed(self, row):
+        """Account for one export row (column -> text); returns whether it was counted"""
+        self.rows += 1
+        tipo = row.get("Tipo", "").strip()
+        if tipo not in CALL_TYPES:
+            return False
+        try:
+            when = datetime.strptime(row["Data de Início"].strip(), DATE_FORMAT)
+        except (KeyError, ValueError):
+            return False
+        self._advance(when)
+
+        origem, destino = row.get("Origem", "").strip(), row.get("Destino", "").strip()
+        number = normalize_number(origem)
+        answered = tipo == "Chamada recebida"
+        if tipo == "Chamada efetuada":
+            called = normalize_number(destino)
+            self.called_numbers.pop(called, None)
+            self.called_numbers[called] = when
+        elif not answered and number in self.called_numbers:
+            return False
+
+        # Like clean_calls on an export (newest first), the latest leg of a call is the one kept
+        call_id = row.get(CALL_ID, "").strip()
+        if call_id:
+            if call_id in self.calls_by_id:
+                previous = self.calls_by_id[call_id]
+                if previous is not None and not previous.dropped:
+                    self._drop(previous)
+            else:
+                self.id_times.append((when, call_id))
+            self.calls_by_id[call_id] = None
+
+        if origem in BLOCKED_ORIGINS or destino in BLOCKED_DESTINATIONS:
+            return False
+        if tipo == "Chamada efetuada":
+            self._returned(normalize_number(row.get("Destino Final", "").strip()), when)
+            return True
+
+        recent = self.recent_by_origin[origem]
+        recent.append(when)
+        self.recent_times.append((when, origem))
+        while recent[0] < when - ATTEMPT_WINDOW:
+            recent.popleft()
+
+        call = _Call(when, origem, answered, duration_seconds(row.get("Tempo de Toque", "")), len(recent))
+        if call_id:
+            self.calls_by_id[call_id] = call
+        if not answered:
+            self.pending[number].append(call)
+            self.pending_times.append((when, number))
+        for window in self.windows:
+            window.add(call)
+        return True
+
+    def snapshot(self):
+        return {
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "feed_time": self.now.isoformat(sep=" ") if self.now else None,
+            "rows": self.rows,
+            "windows": {window.name: window.snapshot() for window in self.windows},
+        }
+
+
+def follow_lines(path, follow=True, poll=0.5):
+    """
+    Lines of a growing file as they are appended ('-' reads stdin until it closes).
+    While following, yields None whenever there is nothing new, so the caller can
+    publish between rows; starts over if the file is truncated or replaced.
+    """
+    if path == "-":
+        # A pipe can't be polled portably (Windows), so a thread reads it
+        lines = queue.Queue()
+
+        def read():
+            for line in sys.stdin:
+                lines.put(line)
+            lines.put(None)
+
+        threading.Thread(target=read, daemon=True).start()
+        while True:
+            try:
+                line = lines.get(timeout=poll)
+            except queue.Empty:
+                yield None
+                continue
+            if line is None:
+                return
+            yield line
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        partial = ""
+        while True:
+            line = f.readline()
+            if line:
+                partial += line
+                if partial.endswith("\n"):
+                    yield partial
+                    partial = ""
+                continue
+            if not follow:
+                if partial:
+                    yield partial
+                return
+            if os.path.getsize(path) < f.tell():
+                f.seek(0)
+                partial = ""
+            yield None
+            time.sleep(poll)
+
+
+def publish(monitor, snapshot_file=SNAPSHOT_FILE):
+    snapshot = monitor.snapshot()
+    parts = []
+    for name, window in snapshot["windows"].items():
+        attempts = window["mean_attempts_missed"]
+        parts.append(
+            f"{WINDOW_LABELS.get(name, name)}: {window['calls']} chamadas, {window['answered_pct']}% atendidas, "
+            f"{window['answered_under_60s_pct']}% < 60s, {window['pending_unreturned']} por devolver, "
+            f"{attempts if attempts is not None else '-'} tentativas (não atendidas)"
+        )
+    print(f"📡 {snapshot['feed_time'] or '-'} | " + " | ".join(parts), flush=True)
+
+    if snapshot_file is not None:
+        snapshot_file = os.fspath(snapshot_file)
+        os.makedirs(os.path.dirname(snapshot_file) or ".", exist_ok=True)
+        tmp = f"{snapshot_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, snapshot_file)
+    return snapshot
+
+
+def run_monitor(path, interval=5, follow=True, snapshot_file=SNAPSHOT_FILE, monitor=None):
+    """
+    Follow a call log in the export layout (title lines, header, one call per line;
+    oldest first, as a live feed appends) and publish a snapshot every `interval`
+    seconds, plus one when the log ends. Returns the monitor.
+    """
+    monitor = monitor or LiveMonitor()
+    header = None
+    last_published = time.monotonic()
+    for line in follow_lines(path, follow):
+        if line is not None:
+            fields = next(csv.reader([line], delimiter=";", quotechar="'"), [])
+            if header is None:
+                # Title lines come before the header
+                if fields and fields[0].strip().lstrip("\ufeff") == "Tipo":
+                    header = [column.strip().lstrip("\ufeff") for column in fields]
+            elif len(fields) >= len(header):
+                monitor.feed(dict(zip(header, fields)))
+
+        if time.monotonic() - last_published >= interval:
+            publish(monitor, snapshot_file)
+            last_published = time.monotonic()
+
+    publish(monitor, snapshot_file)
+    return monitor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Acompanhar os SLAs em tempo real a partir de um registo de chamadas")
+    parser.add_argument("log", help="Ficheiro de chamadas que vai crescendo (formato da exportação), ou - para ler do stdin")
+    parser.add_argument("--interval", type=float, default=5, help="Segundos entre publicações (por omissão: 5)")
+    parser.add_argument("--once", action="store_true", help="Ler o que existe e terminar, sem ficar à espera de linhas novas")
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE, help=f"JSON com o último estado (por omissão: {SNAPSHOT_FILE})")
+    args = parser.parse_args()
+
+    try:
+        run_monitor(args.log, interval=args.interval, follow=not args.once, snapshot_file=args.snapshot)
+    except KeyboardInterrupt:
+        print("\n🛑 Monitorização terminada")
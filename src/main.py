@@ -1,27 +1,49 @@
-import sys
+import argparse
+import glob
+import multiprocessing
 from utils import clear_output_directory
 import metricas
+import profiling
 from data_filtering import process_and_clean_input
-from config import OUTPUT_DIR
+from call_store import process_into_store
+from config import OUTPUT_DIR, CALL_DB_FILE, DATASET_DIR
 
-def setup_cleaning_environment(input_file_path):
+def setup_cleaning_environment(input_file_path, chunksize=None, use_cache=True, store=False, workers=None, db_file=None, start=None, end=None):
     clear_output_directory(OUTPUT_DIR)
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    success = process_and_clean_input(input_file_path)
-    print(success) 
+    input_files = input_file_path if isinstance(input_file_path, list) else [input_file_path]
+    if store:
+        outputs = process_into_store(input_files, db_file=db_file, start=start, end=end)
+    else:
+        outputs = process_and_clean_input(input_files, chunksize=chunksize, use_cache=use_cache, workers=workers, db_file=db_file, start=start, end=end)
+    success = outputs is not None
+    print(success)
     if success:
         print("✅ Processamento concluído com sucesso")
-        metricas.analisar_chamadas()
+        recebidas, devolvidas = outputs
+        metricas.analisar_chamadas(df=recebidas, df_devolvidas=devolvidas)
     else:
         print("❌ Falha no processamento")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python main.py <ficheiro_input.csv>")
-        sys.exit(1)
+    multiprocessing.freeze_support()  # process pool inside the PyInstaller build
+    parser = argparse.ArgumentParser(usage="python main.py <ficheiro_input.csv | 'input/*.csv' | pasta_dataset ...> [--inicio YYYY-MM-DD] [--fim YYYY-MM-DD] [--chunksize N] [--no-cache] [--store] [--workers N] [--db [ficheiro.sqlite]] [--profile]")
+    parser.add_argument("input_files", nargs="+", help=f"Um ou mais CSVs, padrões como input/*.csv, ou a pasta do dataset particionado ({DATASET_DIR})")
+    parser.add_argument("--inicio", help="Analisar só as chamadas a partir deste dia (YYYY-MM-DD)")
+    parser.add_argument("--fim", help="Analisar só as chamadas até este dia, inclusive (YYYY-MM-DD)")
+    parser.add_argument("--chunksize", type=int, help="Ler o CSV em blocos de N linhas (exportações grandes)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorar a cache e ler sempre o CSV")
+    parser.add_argument("--store", action="store_true", help="Juntar o CSV ao arquivo local de chamadas (as saídas cobrem os dias do CSV, ou os de --inicio/--fim)")
+    parser.add_argument("--workers", type=int, help="Processos para ler vários ficheiros em paralelo")
+    parser.add_argument("--db", nargs="?", const=CALL_DB_FILE, help=f"Guardar também as chamadas limpas numa base de dados SQLite (por omissão: {CALL_DB_FILE})")
+    parser.add_argument("--profile", action="store_true", help="Medir cada etapa e guardar logs/profile_main.json")
+    args = parser.parse_args()
+    if args.profile:
+        profiling.enable()
 
-    input_file_path = sys.argv[1]
-    setup_cleaning_environment(input_file_path)
-    
+    # Padrões expandidos aqui também, para shells que não o fazem (Windows)
+    input_files = [f for pattern in args.input_files for f in (sorted(glob.glob(pattern)) or [pattern])]
+    setup_cleaning_environment(input_files, chunksize=args.chunksize, use_cache=not args.no_cache, store=args.store, workers=args.workers, db_file=args.db, start=args.inicio, end=args.fim)
+    profiling.write_report("main", input_files=input_files, chunksize=args.chunksize, store=args.store, inicio=args.inicio, fim=args.fim)
 
 
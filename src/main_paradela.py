@@ -1,3 +1,4 @@
+import argparse
 import sys
 import pandas as pd
 from datetime import datetime, timedelta
@@ -5,6 +6,13 @@ import os
 from datetime import timedelta
 
 import calls_counting
+import profiling
+from number_normalization import normalize_numbers
+from durations import add_duration_seconds
+from utils import write_csv
+from export_loader import QUOTED_COLUMNS, load_export_cached
+from call_dataset import day_range, load_calls
+from profiling import profiled
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(sys.argv[0]))
@@ -12,20 +20,7 @@ OUTPUT_DIR = os.path.join(BASE_DIR, "output_paradela")
 CLEAN_OUTPUT_FILE = os.path.join(OUTPUT_DIR, "todas_paradela.csv")
 DEVOLVIDAS_FILE = os.path.join(OUTPUT_DIR, "chamadas_devolvidas.csv")
 NAO_DEVOLVIDAS_FILE = os.path.join(OUTPUT_DIR, "chamadas_nao_devolvidas.csv")
-
-def parse_tempo(tempo_str):
-    try:
-        parts = list(map(int, tempo_str.strip().split(":")))
-        if len(parts) == 3:
-            h, m, s = parts
-        elif len(parts) == 2:
-            h = 0
-            m, s = parts
-        else:
-            return 0
-        return h * 3600 + m * 60 + s
-    except:
-        return 0
+LINHA_PARADELA = "351234246184"
 
 def parse_datetime(row):
     try:
@@ -34,22 +29,9 @@ def parse_datetime(row):
     except:
         return pd.NaT
 
-def normalizar_numero(numero):
-    if pd.isna(numero):
-        return ""
-  
-    numero_limpo = ''.join(filter(str.isdigit, str(numero)))
-
-    if numero_limpo in ['234246184', '234246187']:
-        return '351234246184' if numero_limpo == '234246184' else '351234246187'
-    
-    if len(numero_limpo) == 9 and numero_limpo.startswith(('91', '92', '93', '96')):
-        return '351' + numero_limpo
-    return numero_limpo
 
-
-
-def identificar_devolvidas(df, output_dir=OUTPUT_DIR, max_minutos=30):
+@profiled()
+def identificar_devolvidas(df, output_dir=OUTPUT_DIR, max_minutos=30, linha=LINHA_PARADELA):
     df = df.copy()
     
     try:
@@ -62,63 +44,71 @@ def identificar_devolvidas(df, output_dir=OUTPUT_DIR, max_minutos=30):
     
 
     unanswered = df[
-        (df['Destino_norm'] == '351234246184') & 
+        (df['Destino_norm'] == linha) & 
         (df['Tipo'].str.strip().str.lower() == 'chamada não atendida')
     ].copy()
     
     outgoing = df[
-        (df['Origem_norm'] == '351234246184') & 
-        (df['Tipo'].str.strip().str.lower() == 'chamada efetuada')
-    ].copy()
-    
-    devolvidas_list = []
-    
-    for idx, na_call in unanswered.iterrows():
-        na_origin = na_call['Origem_norm']
-        na_time = na_call['DataHora']
-        
-        if pd.isna(na_time):  
-            continue
-            
-
-        matching_outgoing = outgoing[
-            (outgoing['Destino_norm'] == na_origin) &
-            (outgoing['DataHora'] > na_time) &
-            (outgoing['DataHora'] <= na_time + timedelta(minutes=max_minutos))
-        ].sort_values('DataHora')
-        
-        if not matching_outgoing.empty:
-            first_return = matching_outgoing.iloc[0]
-            tempo_devolucao = (first_return['DataHora'] - na_time).total_seconds()
-            
- 
-            na_call['Devolvida'] = True
-            na_call['Tempo até Devolução (s)'] = tempo_devolucao
-            na_call['DataHora Devolução'] = first_return['DataHora']
-            na_call['ID Chamada Devolução'] = first_return.name
-            
-            devolvidas_list.append(na_call)
-    
-    devolvidas_df = pd.DataFrame(devolvidas_list) if devolvidas_list else pd.DataFrame()
+        (df['Origem_norm'] == linha) & 
+        (df['Tipo'].str.strip().str.lower() == 'chamada efetuada') &
+        (df['DataHora'].notna())
+    ].sort_values('DataHora', kind='stable')
+
+    # Primeira chamada efetuada para o mesmo número até max_minutos depois de cada não atendida
+    nao_atendidas = unanswered[unanswered['DataHora'].notna()]
+    matches = pd.merge_asof(
+        pd.DataFrame({
+            'Destino_norm': nao_atendidas['Origem_norm'].to_numpy(),
+            'DataHora': nao_atendidas['DataHora'].to_numpy(),
+            'ID': nao_atendidas.index,
+        }).sort_values('DataHora', kind='stable'),
+        pd.DataFrame({
+            'Destino_norm': outgoing['Destino_norm'].to_numpy(),
+            'DataHora Devolução': outgoing['DataHora'].to_numpy(),
+            'ID Chamada Devolução': outgoing.index,
+        }),
+        left_on='DataHora',
+        right_on='DataHora Devolução',
+        by='Destino_norm',
+        direction='forward',
+        allow_exact_matches=False,
+        tolerance=pd.Timedelta(minutes=max_minutos),
+    ).dropna(subset=['DataHora Devolução']).set_index('ID')
+
+    if not matches.empty:
+        devolvidas_df = unanswered[unanswered.index.isin(matches.index)].copy()
+        matches = matches.reindex(devolvidas_df.index)
+        devolvidas_df['Devolvida'] = True
+        devolvidas_df['Tempo até Devolução (s)'] = (matches['DataHora Devolução'] - matches['DataHora']).dt.total_seconds()
+        devolvidas_df['DataHora Devolução'] = matches['DataHora Devolução']
+        devolvidas_df['ID Chamada Devolução'] = matches['ID Chamada Devolução'].astype(int)
+    else:
+        devolvidas_df = pd.DataFrame()
     nao_devolvidas_df = unanswered[~unanswered.index.isin(devolvidas_df.index)] if not unanswered.empty else pd.DataFrame()
     
     if not devolvidas_df.empty:
-        devolvidas_df.to_csv(os.path.join(output_dir, 'chamadas_devolvidas.csv'), index=False, sep=';')
+        write_csv(devolvidas_df, os.path.join(output_dir, 'chamadas_devolvidas.csv'), QUOTED_COLUMNS)
     if not nao_devolvidas_df.empty:
-        nao_devolvidas_df.to_csv(os.path.join(output_dir, 'chamadas_nao_devolvidas.csv'), index=False, sep=';')
+        write_csv(nao_devolvidas_df, os.path.join(output_dir, 'chamadas_nao_devolvidas.csv'), QUOTED_COLUMNS)
     
     return devolvidas_df, nao_devolvidas_df
 
-def process_and_clean_paradela(input_file, clean_output_file):
+@profiled()
+def process_and_clean_paradela(input_file, clean_output_file, date_range=None):
     if not os.path.exists(input_file):
         return None
     print(f"📄 A tentar abrir: {input_file}")
 
     try:
-        df = pd.read_csv(input_file, delimiter=";", skiprows=2)
+        # Todas as colunas, porque chamadas_devolvidas/nao_devolvidas.csv levam a exportação inteira.
+        # Um CSV sem intervalo vem da cache; com intervalo, ou da pasta do dataset, só se lê o necessário
+        if date_range is None and not os.path.isdir(input_file):
+            df = load_export_cached(input_file, drop_columns=())
+        else:
+            df = load_calls(input_file, date_range, drop_columns=())
 
-        df["Destino_norm"] = df["Destino"].astype(str).apply(normalizar_numero)
-        df["Origem_norm"] = df["Origem"].astype(str).apply(normalizar_numero)
+        df["Destino_norm"] = normalize_numbers(df["Destino"], "paradela")
+        df["Origem_norm"] = normalize_numbers(df["Origem"], "paradela")
 
         df = df[
             (df["Destino_norm"] != "351915942292") &
@@ -127,16 +117,17 @@ def process_and_clean_paradela(input_file, clean_output_file):
 
         
         mask = (
-            ((df["Destino_norm"] == "351234246184") | (df["Origem_norm"] == "351234246184")) & 
+            ((df["Destino_norm"] == LINHA_PARADELA) | (df["Origem_norm"] == LINHA_PARADELA)) & 
             (~df["Tipo"].str.lower().str.contains('reencaminhada'))
         )
         df = df[mask].copy()
+        df = add_duration_seconds(df)
     
         # Guardar CSV filtrado
         if not os.path.exists(os.path.dirname(clean_output_file)):
             os.makedirs(os.path.dirname(clean_output_file))
 
-        df.to_csv(clean_output_file, index=False, sep=";")
+        write_csv(df, clean_output_file, QUOTED_COLUMNS)
         return df
 
     except Exception as e:
@@ -179,29 +170,22 @@ def process_and_clean_paradela(input_file, clean_output_file):
 
 #     return group
 
+@profiled()
 def calculo_metricas(df, chamadas_devolvidas, chamadas_nao_devolvidas):
     if df is None or df.empty:
         print("DataFrame vazio ou inválido")
         return
     
     if 'Destino_norm' not in df.columns or 'Origem_norm' not in df.columns:
-        df["Destino_norm"] = df["Destino"].apply(normalizar_numero)
-        df["Origem_norm"] = df["Origem"].apply(normalizar_numero)
+        df["Destino_norm"] = normalize_numbers(df["Destino"], "paradela")
+        df["Origem_norm"] = normalize_numbers(df["Origem"], "paradela")
 
-    df = df.groupby("Origem", group_keys=False).apply(calls_counting.count_calls_within_one_hour)
+    df = calls_counting.count_calls_within_one_hour(df)
 
 
     df = df.sort_values('Data de Início', ascending=False).reset_index(drop=True)
 
     df_filtrado = df[~df["Tipo"].str.strip().str.lower().str.contains('efetuada')].copy()
-    
-
-    if 'Tempo de Toque' in df_filtrado.columns:
-        df_filtrado["Tempo de Espera (s)"] = df_filtrado["Tempo de Toque"].apply(parse_tempo)
-    
-    if 'Duração' in df_filtrado.columns:
-        df_filtrado["Duraçao (s)"] = df_filtrado["Duração"].apply(parse_tempo)
-
 
     df_recebidas = df_filtrado[df_filtrado["Tipo"].str.strip().str.lower() == "chamada recebida"].copy()
     df_nao_recebidas = df_filtrado[df_filtrado["Tipo"].str.strip().str.lower() == "chamada não atendida"].copy()
@@ -228,7 +212,7 @@ def calculo_metricas(df, chamadas_devolvidas, chamadas_nao_devolvidas):
         percentagem_atendidas = (total_chamadas_atendidas / total_chamadas * 100) if total_chamadas > 0 else 0
         chamadas_rapidas = (df_recebidas["Tempo de Espera (s)"] < 60).sum()
         perc_rapidas = (chamadas_rapidas / total_chamadas_atendidas * 100) if total_chamadas_atendidas > 0 else 0
-        duracao_media = df_recebidas["Duraçao (s)"].mean()
+        duracao_media = df_recebidas["Duração (s)"].mean()
         tempo_medio_espera = df_recebidas["Tempo de Espera (s)"].mean()
     else:
         percentagem_atendidas = 0
@@ -259,7 +243,7 @@ def calculo_metricas(df, chamadas_devolvidas, chamadas_nao_devolvidas):
         
         chamadas_atendidas = df[
             (df['Tipo'].str.strip().str.lower() == 'chamada recebida') &
-            (df['Destino_norm'] == '351234246184')
+            (df['Destino_norm'] == LINHA_PARADELA)
         ]
         numeros_com_atendimento.update(chamadas_atendidas['Origem_norm'].unique())
         
@@ -268,17 +252,19 @@ def calculo_metricas(df, chamadas_devolvidas, chamadas_nao_devolvidas):
         ]
         
         print(f"Chamadas não devolvidas (números únicos): {verdadeiras_nao_devolvidas['Origem_norm'].nunique()}")
-        return df
+    return df
 
-def setup_cleaning_environment_paradela():
+def setup_cleaning_environment_paradela(date_range=None):
     print(f"🔍 Diretório atual: {os.getcwd()}")
     print(f"📂 INPUT_FILE definido como: {INPUT_FILE}")
-    df = process_and_clean_paradela(INPUT_FILE, CLEAN_OUTPUT_FILE)
+    df = process_and_clean_paradela(INPUT_FILE, CLEAN_OUTPUT_FILE, date_range)
 
     if df is not None:
         chamadas_devolvidas, chamadas_nao_devolvidas = identificar_devolvidas(df)
 
         df_with_total_chamadas = calculo_metricas(df, chamadas_devolvidas, chamadas_nao_devolvidas)
+        if df_with_total_chamadas is None:
+            return
 
         unnecessary_columns = [
             "Utilizador", "Telefone de Origem", "Número de Páginas do Fax", "Tipo de Telefone",
@@ -294,13 +280,22 @@ def setup_cleaning_environment_paradela():
 
         df_with_total_chamadas = df_with_total_chamadas.sort_values('Data de Início', ascending=False)
         output_file = os.path.join(OUTPUT_DIR, "todas_paradela.csv")
-        df_with_total_chamadas.to_csv(output_file, index=False, sep=';')
+        write_csv(df_with_total_chamadas, output_file, QUOTED_COLUMNS)
 
         print(f"\nCSV final gerado em: {output_file}")
 
 if __name__ == "__main__":
-    if len(sys.argv) >= 2:
-        INPUT_FILE = os.path.abspath(sys.argv[1])
+    parser = argparse.ArgumentParser(usage="python main_paradela.py [ficheiro.csv | pasta_dataset] [--inicio YYYY-MM-DD] [--fim YYYY-MM-DD] [--profile]")
+    parser.add_argument("input_file", nargs="?", help="CSV exportado, ou pasta do dataset particionado por ano/mês")
+    parser.add_argument("--inicio", help="Analisar só as chamadas a partir deste dia (YYYY-MM-DD)")
+    parser.add_argument("--fim", help="Analisar só as chamadas até este dia, inclusive (YYYY-MM-DD)")
+    parser.add_argument("--profile", action="store_true", help="Medir cada etapa e guardar logs/profile_paradela.json")
+    args = parser.parse_args()
+    if args.profile:
+        profiling.enable()
+
+    if args.input_file:
+        INPUT_FILE = os.path.abspath(args.input_file)
         print(f"📥 CSV fornecido por argumento: {INPUT_FILE}")
     else:
         INPUT_FILE = os.path.join(BASE_DIR, "input", "CallsSince01Jan.csv")
@@ -312,4 +307,5 @@ if __name__ == "__main__":
     NAO_DEVOLVIDAS_FILE = os.path.join(OUTPUT_DIR, "chamadas_nao_devolvidas.csv")
 
     print(f"📂 OUTPUT_DIR definido como: {OUTPUT_DIR}")
-    setup_cleaning_environment_paradela()
+    setup_cleaning_environment_paradela(day_range(args.inicio, args.fim))
+    profiling.write_report("paradela", input_file=INPUT_FILE, inicio=args.inicio, fim=args.fim)
@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+import pandas as pd
+from call_metrics import compute_metrics
+from call_store import STORE_COLUMNS, store_returns
+from config import STORE_DIR
+from sla_cube import PERIODS, PROFILES, build_cube, query_cube
+
+HOST = "127.0.0.1"
+PORT = 8765
+RECEIVED_TYPES = ["Chamada Não Atendida", "Chamada recebida"]
+
+
+class StoreEmpty(Exception):
+    """The store has no calls yet (main.py --store was never run)"""
+
+
+class TTLCache:
+    """LRU cache whose entries also expire `ttl` seconds after being stored"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+def _month_files(store_dir):
+    return sorted((Path(store_dir) / "calls").glob("*.pkl"))
+
+
+def store_version(store_dir=STORE_DIR):
+    """Changes whenever an ingest rewrites a month of the stored calls; None for an empty store"""
+    stats = [path.stat() for path in _month_files(store_dir)]
+    if not stats:
+        return None
+    return len(stats), max(stat.st_mtime_ns for stat in stats), sum(stat.st_size for stat in stats)
+
+
+# Worker processes keep the calls of the store version they last loaded, by month
+# file, so a new version only reads the months an ingest rewrote
+_worker_calls = {}
+
+
+def _calls(store_dir, version):
+    if _worker_calls.get("version") != (store_dir, version):
+        loaded = _worker_calls.get("months", {})
+        months = {}
+        for path in _month_files(store_dir):
+            stat = path.stat()
+            key = (str(path), stat.st_mtime_ns, stat.st_size)
+            months[key] = loaded[key] if key in loaded else pd.read_pickle(path)
+        calls = pd.concat(months.values(), ignore_index=True) if months else pd.DataFrame()
+        _worker_calls.update(version=(store_dir, version), months=months, calls=calls)
+    return _worker_calls["calls"]
+
+
+def cube_job(store_dir, version):
+    """SLA cube of the whole store (run in the worker pool)"""
+    return build_cube(_calls(store_dir, version))
+
+
+def metrics_job(store_dir, version, start=None, end=None, lines=None):
+    """analisar_chamadas figures of the stored calls in [start, end] (run in the worker pool)"""
+    calls = _calls(store_dir, version)
+    selected = calls[calls["Tipo"].isin(RECEIVED_TYPES)]
+    if start is not None:
+        selected = selected[selected["Data de Início"] >= pd.Timestamp(start)]
+    if end is not None:
+        selected = selected[selected["Data de Início"] < pd.Timestamp(end) + pd.Timedelta(days=1)]
+    if lines is not None:
+        selected = selected[selected["Destino Final"].astype(str).str.strip().isin(lines)]
+    metrics = compute_metrics(selected.drop(columns=STORE_COLUMNS), store_returns(calls, selected))
+    return {key: None if isinstance(value, float) and math.isnan(value) else value
+            for key, value in asdict(metrics).items()}
+
+
+def _date(value, name):
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value).strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"Data inválida em '{name}': {value} (use YYYY-MM-DD)")
+
+
+def _list(value):
+    return tuple(item.strip() for item in value.split(",") if item.strip()) if value else None
+
+
+class MetricsService:
+    """
+    Answers metric queries over the call store kept in memory. The SLA cube of
+    the store is rebuilt (in the worker pool) only when an ingest changes the
+    store; results are cached by query and store version.
+    """
+
+    def __init__(self, store_dir=STORE_DIR, workers=None, cache_size=256, ttl=300):
+        self.store_dir = str(store_dir)
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.cache = TTLCache(cache_size, ttl)
+        self.version = None
+        self.cube = None
+        self._reload = None  # created in serve(), inside the running loop
+
+    async def _refresh(self):
+        version = store_version(self.store_dir)
+        if version is None:
+            raise StoreEmpty(f"Arquivo de chamadas vazio: {self.store_dir} (correr main.py --store primeiro)")
+        async with self._reload:
+            if version != self.version:
+                loop = asyncio.get_running_loop()
+                self.cube = await loop.run_in_executor(self.pool, cube_job, self.store_dir, version)
+                self.version = version
+                print(f"🔄 Arquivo carregado: {int(self.cube['calls'].sum())} chamadas no cubo")
+        return version
+
+    async def _cached(self, key, compute):
+        version = await self._refresh()
+        key = (*key, version)
+        result = self.cache.get(key)
+        if result is None:
+            result = await compute(version)
+            self.cache.put(key, result)
+        return result
+
+    async def sla(self, params):
+        """/sla: the cube rolled up by period (por), kept apart by agrupar"""
+        start, end = _date(params.get("inicio"), "inicio"), _date(params.get("fim"), "fim")
+        by = params.get("por", "day")
+        by = None if by == "total" else by
+        if by is not None and by not in PERIODS and by not in PROFILES:
+            raise ValueError(f"Agregação desconhecida: {by} (use {', '.join([*PERIODS, *PROFILES, 'total'])})")
+        group = _list(params.get("agrupar", "type")) or ()
+        if set(group) - {"line", "type"}:
+            raise ValueError("agrupar aceita apenas line e type")
+        lines, types = _list(params.get("linha")), _list(params.get("tipo"))
+
+        async def compute(version):
+            rollup = query_cube(self.cube, start, end, by=by, group=group, lines=lines, types=types)
+            return json.loads(rollup.to_json(orient="records", date_format="iso"))
+        return await self._cached(("sla", start, end, by, group, lines, types), compute)
+
+    async def metricas(self, params):
+        """/metricas: the analisar_chamadas figures for a date range and lines"""
+        start, end = _date(params.get("inicio"), "inicio"), _date(params.get("fim"), "fim")
+        lines = _list(params.get("linha"))
+
+        async def compute(version):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, metrics_job, self.store_dir, version, start, end, lines)
+        return await self._cached(("metricas", start, end, lines), compute)
+
+    def estado(self):
+        return {
+            "store": self.store_dir,
+            "version": self.version,
+            "cube_rows": None if self.cube is None else len(self.cube),
+            "cache": {"entries": len(self.cache.entries), "hits": self.cache.hits, "misses": self.cache.misses},
+        }
+
+    async def handle(self, reader, writer):
+        """One HTTP/1.1 GET per connection"""
+        status, body = 200, None
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # headers are not used
+            method, target, _ = request.decode("latin-1").split(" ", 2)
+            url = urlsplit(target)
+            params = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+            if method != "GET":
+                status, body = 405, {"erro": "Só pedidos GET"}
+            elif url.path == "/sla":
+                body = await self.sla(params)
+            elif url.path == "/metricas":
+                body = await self.metricas(params)
+            elif url.path == "/estado":
+                body = self.estado()
+            else:
+                status, body = 404, {"erro": f"Caminho desconhecido: {url.path} (use /sla, /metricas ou /estado)"}
+        except ValueError as e:
+            status, body = 400, {"erro": str(e)}
+        except StoreEmpty as e:
+            status, body = 503, {"erro": str(e)}
+        except Exception as e:
+            status, body = 500, {"erro": f"Erro ao calcular métricas: {e}"}
+
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  500: "Internal Server Error", 503: "Service Unavailable"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        self._reload = asyncio.Lock()
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"📡 Serviço de métricas em http://{host}:{port} (/sla, /metricas, /estado)")
+        try:
+            await self._refresh()
+        except StoreEmpty as e:
+            print(f"⚠️ {e}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço local de métricas sobre o arquivo de chamadas")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--store", default=STORE_DIR, help=f"Pasta do arquivo de chamadas (por omissão: {STORE_DIR})")
+    parser.add_argument("--workers", type=int, help="Processos para os cálculos pesados (por omissão: um por CPU)")
+    parser.add_argument("--cache-size", type=int, default=256, help="Resultados guardados em cache")
+    parser.add_argument("--ttl", type=float, default=300, help="Segundos até um resultado em cache expirar")
+    args = parser.parse_args()
+
+    service = MetricsService(args.store, workers=args.workers, cache_size=args.cache_size, ttl=args.ttl)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n🛑 Serviço terminado")
+    finally:
+        service.close()
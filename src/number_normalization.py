@@ -0,0 +1,107 @@
+from itertools import islice
+import numpy as np
+import pandas as pd
+
+PARADELA_NUMBERS = {"234246184": "351234246184", "234246187": "351234246187"}
+MOBILE_PREFIXES = ("91", "92", "93", "96")
+
+
+def _national(numbers):
+    """'+351 912 345 678' -> '912345678' (strip quotes, spaces and the +351/351 prefix)"""
+    return (
+        numbers.str.strip()
+        .str.replace("'", "", regex=False)
+        .str.replace(" ", "", regex=False)
+        .str.removeprefix("+351")
+        .str.removeprefix("351")
+    )
+
+
+def _last9(numbers):
+    """Last 9 digits of the number"""
+    return numbers.str.replace(r"\D", "", regex=True).str[-9:]
+
+
+def _paradela(numbers):
+    """Digits only, with the Paradela lines and 9-digit mobiles prefixed by 351"""
+    digits = numbers.str.replace(r"\D", "", regex=True)
+    mobile = (digits.str.len() == 9) & digits.str.startswith(MOBILE_PREFIXES)
+    return digits.where(~mobile, "351" + digits).replace(PARADELA_NUMBERS)
+
+
+def _e164(numbers):
+    """'+351912345678' style; short extensions are flagged with '***'"""
+    numbers = numbers.str.strip()
+    for char in [" ", "+", "*", "'", '"']:
+        numbers = numbers.str.replace(char, "", regex=False)
+    length = numbers.str.len()
+    return pd.Series(
+        np.select(
+            [
+                numbers.str.startswith("9") & (length == 9),
+                numbers.str.startswith("351") & (length >= 11),
+                length < 9,
+                numbers.str.isdigit(),
+            ],
+            ["+351" + numbers, "+" + numbers, numbers + "***", "+" + numbers],
+            default=numbers,
+        ),
+        index=numbers.index,
+    )
+
+
+# rule name -> (vectorized rule over a str Series, value used for missing numbers)
+RULES = {
+    "national": (_national, ""),
+    "last9": (_last9, ""),
+    "paradela": (_paradela, ""),
+    "e164": (_e164, np.nan),
+}
+
+# Distinct numbers memoized per rule. Bounded, since the live monitor and the
+# metrics service normalize for as long as they run; the oldest entries go first.
+MEMO_SIZE = 200_000
+_cache = {rule: {} for rule in RULES}
+
+
+def _trim(cache):
+    excess = len(cache) - MEMO_SIZE
+    if excess > 0:
+        for key in list(islice(cache, excess)):
+            del cache[key]
+
+
+def normalize_numbers(numbers, rule="national"):
+    """
+    Normalize a column of phone numbers with one of the RULES.
+
+    The rule only runs over distinct values not seen before; results are
+    memoized per rule (up to MEMO_SIZE numbers), so later stages normalizing
+    the same numbers reuse them.
+    """
+    normalize, missing_value = RULES[rule]
+    cache = _cache[rule]
+
+    codes, uniques = pd.factorize(numbers)
+    keys = [str(value) for value in uniques]
+    new = [key for key in dict.fromkeys(keys) if key not in cache]
+    results = dict(zip(new, normalize(pd.Series(new, dtype=object)))) if new else {}
+
+    values = np.array([results[key] if key in results else cache[key] for key in keys] + [missing_value], dtype=object)
+    cache.update(results)
+    _trim(cache)
+    return pd.Series(values[codes], index=numbers.index)
+
+
+def normalize_number(number, rule="national"):
+    """normalize_numbers() for one number (live feed), sharing the same memo"""
+    normalize, missing_value = RULES[rule]
+    if number is None:
+        return missing_value
+    cache = _cache[rule]
+    key = str(number)
+    if key in cache:
+        return cache[key]
+    value = cache[key] = normalize(pd.Series([key], dtype=object)).iloc[0]
+    _trim(cache)
+    return value
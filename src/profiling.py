@@ -0,0 +1,143 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, the report has no RSS
+    resource = None
+
+# Same folder as metricas' log.txt
+LOG_DIR = Path(__file__).resolve().parent / "logs"
+
+_enabled = False
+_started = None
+_stages = []
+_stack = []
+
+
+def enable():
+    """
+    Start recording stages (wall/CPU time, rows, peak memory) for write_report().
+    tracemalloc makes allocation-heavy code slower, so compare profiled runs with
+    each other rather than with normal ones.
+    """
+    global _enabled, _started
+    _enabled = True
+    _started = time.perf_counter()
+    _stages.clear()
+    tracemalloc.start()
+
+
+def _rows(obj):
+    """Rows of a frame, or of all the frames in a tuple/list; None for anything else"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        counts = [_rows(item) for item in obj]
+        counts = [n for n in counts if n is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Record one stage. Yields a dict where the caller can set "rows_out".
+
+    peak_traced_mb is the peak of Python allocations during the stage (nested
+    stages included); max_rss_mb is the process high-water mark when it ended.
+    Work done in other processes (the parallel export parsing) is not traced.
+    """
+    if not _enabled:
+        yield {}
+        return
+
+    record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+    if _stack:
+        # The peak is reset below; keep what the enclosing stage reached so far
+        _stack[-1]["_child_peak"] = max(_stack[-1]["_child_peak"], tracemalloc.get_traced_memory()[1])
+    record["_child_peak"] = 0
+    record["depth"] = len(_stack)
+    _stack.append(record)
+    _stages.append(record)
+    tracemalloc.reset_peak()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = round(time.perf_counter() - wall, 4)
+        record["cpu_s"] = round(time.process_time() - cpu, 4)
+        peak = max(record.pop("_child_peak"), tracemalloc.get_traced_memory()[1])
+        record["peak_traced_mb"] = round(peak / (1 << 20), 1)
+        record["max_rss_mb"] = _max_rss_mb()
+        _stack.pop()
+        if _stack:
+            _stack[-1]["_child_peak"] = max(_stack[-1]["_child_peak"], peak)
+
+
+def profiled(name=None):
+    """
+    Decorator form of stage(): rows in are those of the first DataFrame argument,
+    rows out those of the returned frame(s). Costs one flag check when disabled.
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            frames = [a for a in list(args) + list(kwargs.values()) if isinstance(a, pd.DataFrame)]
+            with stage(stage_name, _rows(frames[0]) if frames else None) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = _rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def write_report(pipeline, log_dir=LOG_DIR, **details):
+    """
+    Write logs/profile_<pipeline>.json with the recorded stages (in start order,
+    depth > 0 for stages run inside another) and print a summary.
+    Does nothing unless enable() was called.
+    """
+    if not _enabled:
+        return None
+
+    report = {
+        "pipeline": pipeline,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **details,
+        "total_wall_s": round(time.perf_counter() - _started, 4),
+        "max_rss_mb": _max_rss_mb(),
+        "stages": list(_stages),
+    }
+    log_dir = Path(log_dir)
+    log_dir.mkdir(exist_ok=True)
+    report_file = log_dir / f"profile_{pipeline}.json"
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+    print(f"\n⏱️ Perfil de execução ({report['total_wall_s']:.2f}s):")
+    for record in _stages:
+        rows = f"{record['rows_in']} ➡️ {record['rows_out']}"
+        print(f"{'  ' * (record['depth'] + 1)}- {record['stage']}: {record['wall_s']:.3f}s "
+              f"(CPU {record['cpu_s']:.3f}s), linhas {rows}, pico {record['peak_traced_mb']} MB")
+    print(f"📁 Relatório guardado em: {report_file}")
+    return report_file
@@ -1,56 +1,79 @@
 from datetime import timedelta
+import numpy as np
 import pandas as pd
 import os
-from utils import normalize_number
+from number_normalization import normalize_numbers
+from profiling import profiled
+from utils import write_csv
 
+RETURN_WINDOW = timedelta(days=3)
+
+def match_returns(unanswered, outgoing):
+    """
+    First outgoing call to each unanswered call's number within RETURN_WINDOW,
+    as a frame of (ordem, posicao, Data Chamada Não Atendida): the positions of
+    the unanswered and outgoing rows. outgoing must be sorted by Data de Início.
+    """
+    missed = pd.DataFrame({
+        "Destino_norm": unanswered["Origem_norm"].to_numpy(),
+        "Data Chamada Não Atendida": unanswered["Data de Início"].to_numpy(),
+        "ordem": np.arange(len(unanswered)),
+    }).dropna(subset=["Data Chamada Não Atendida"])
+
+    return pd.merge_asof(
+        missed.sort_values("Data Chamada Não Atendida", kind="stable"),
+        pd.DataFrame({
+            "Destino_norm": outgoing["Destino_norm"].to_numpy(),
+            "Data de Início": outgoing["Data de Início"].to_numpy(),
+            "posicao": np.arange(len(outgoing)),
+        }),
+        left_on="Data Chamada Não Atendida",
+        right_on="Data de Início",
+        by="Destino_norm",
+        direction="forward",
+        allow_exact_matches=False,
+        tolerance=pd.Timedelta(RETURN_WINDOW),
+    ).dropna(subset=["posicao"]).sort_values("ordem")
+
+@profiled()
 def filter_returns(df, output_dir):
+    """
+    Match every missed call to the first outgoing call back to the same number
+    within RETURN_WINDOW, using a single forward as-of join on (number, time).
+    """
     df = df.copy()
     df["Data de Início"] = pd.to_datetime(df["Data de Início"], errors="coerce")
-    df["Origem_norm"] = df["Origem"].apply(normalize_number)
-    df["Destino_norm"] = df["Destino Final"].apply(normalize_number)
+    df["Origem_norm"] = normalize_numbers(df["Origem"])
+    df["Destino_norm"] = normalize_numbers(df["Destino Final"])
 
     unanswered = df[df["Tipo"] == "Chamada Não Atendida"]
     outgoing = df[df["Tipo"] == "Chamada efetuada"]
 
     account_sims = set(df[df["Tipo"].isin(["Chamada efetuada", "Chamada recebida"])]["Origem_norm"].unique())
-    
-    returns = []
 
     print(f"Total unanswered: {len(unanswered)}")
     print(f"Total outgoing: {len(outgoing)}")
 
-    for idx, na_call in unanswered.iterrows():
-        na_origin = na_call["Origem_norm"]
-        na_dest = na_call["Destino_norm"]
-        na_time = na_call["Data de Início"]
-
-        print(f"\nChecking missed call at {na_time} from {na_origin} to {na_dest}")
-
+    outgoing = outgoing[
+        outgoing["Origem_norm"].isin(account_sims) &
+        outgoing["Data de Início"].notna()
+    ].sort_values("Data de Início", kind="stable")
 
-        matching_outgoing = outgoing[
-            (outgoing["Origem_norm"].isin(account_sims)) &
-            (outgoing["Destino_norm"] == na_origin) &
-            (outgoing["Data de Início"] > na_time) &
-            (outgoing["Data de Início"] <= na_time + timedelta(days=3))
-        ].sort_values("Data de Início")
+    matches = match_returns(unanswered, outgoing)
 
-        print(f"Found {len(matching_outgoing)} possible return calls")
-        
-        if not matching_outgoing.empty:
-            first_return = matching_outgoing.iloc[0].copy()
-            print(f"First return at {first_return['Data de Início']}")
-            return_time = first_return["Data de Início"]
-            tempo_devolucao = (return_time - na_time).total_seconds()
+    print(f"Found {len(matches)} returned calls")
 
-            first_return["Data Chamada Não Atendida"] = na_time
-            first_return["Tempo até Devolução (s)"] = tempo_devolucao
-            returns.append(first_return)
+    if matches.empty:
+        return pd.DataFrame()
 
-    returns_df = pd.DataFrame(returns)
+    returns_df = outgoing.iloc[matches["posicao"].astype(int)].copy()
+    returns_df["Data Chamada Não Atendida"] = matches["Data Chamada Não Atendida"].to_numpy()
+    returns_df["Tempo até Devolução (s)"] = (
+        returns_df["Data de Início"] - returns_df["Data Chamada Não Atendida"]
+    ).dt.total_seconds()
 
-    if not returns_df.empty:
-        output_path = os.path.join(output_dir, "devolvidas.csv")
-        returns_df = returns_df.sort_values("Data de Início").reset_index(drop=True)
-        returns_df.to_csv(output_path, index=False, sep=";")
+    output_path = os.path.join(output_dir, "devolvidas.csv")
+    returns_df = returns_df.sort_values("Data de Início").reset_index(drop=True)
+    write_csv(returns_df, output_path)
 
     return returns_df
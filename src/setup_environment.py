@@ -4,6 +4,9 @@ import glob
 import shutil
 from pathlib import Path
 import pandas as pd
+from data_filtering import remove_unanswered_after_received
+from number_normalization import normalize_numbers
+from export_loader import load_export
 
 INPUT_FILE = "../input/maio01_13.csv"
 OUTPUT_DIR = ""
@@ -20,43 +23,6 @@ def clear_output_directory(output_dir=OUTPUT_DIR):
             except IsADirectoryError:
                 shutil.rmtree(file_path)
 
-def normalize_number(number):
-    if pd.isna(number):
-        return ""
-    return (
-        str(number)
-        .strip()
-        .replace("'", "")
-        .replace(" ", "")
-        .removeprefix("+351")
-        .removeprefix("351")
-    )
-
-def remove_unanswered_after_received(df):
-    df = df.copy()
-    df["Data de Início"] = pd.to_datetime(df["Data de Início"], errors="coerce")
-    df["Origem_norm"] = df["Origem"].apply(normalize_number)
-    df["Destino_norm"] = df["Destino"].apply(normalize_number)
-
-    unanswered = df[df["Tipo"] == "Chamada Não Atendida"]
-    outgoing = df[df["Tipo"] == "Chamada efetuada"]
-
-    indices_to_remove = set()
-
-    for idx, na_call in unanswered.iterrows():
-        na_origin = na_call["Origem_norm"]
-        na_time = na_call["Data de Início"]
-
-        previous_outgoing = outgoing[
-            (outgoing["Destino_norm"] == na_origin) &
-            (outgoing["Data de Início"] < na_time)
-        ]
-
-        if not previous_outgoing.empty:
-            indices_to_remove.add(idx)
-
-    return df.drop(index=indices_to_remove).reset_index(drop=True)
-
 def count_calls_within_one_hour(group):
     group = group.sort_values('Data de Início', ascending=False).reset_index(drop=True)
     group['Total Chamadas'] = pd.NA
@@ -100,8 +66,8 @@ def filter_returns(df, output_dir=OUTPUT_DIR):
 
     df = df.copy()
     df["Data de Início"] = pd.to_datetime(df["Data de Início"], errors="coerce")
-    df["Origem_norm"] = df["Origem"].apply(normalize_number)
-    df["Destino_norm"] = df["Destino"].apply(normalize_number)
+    df["Origem_norm"] = normalize_numbers(df["Origem"])
+    df["Destino_norm"] = normalize_numbers(df["Destino"])
 
     unanswered = df[df["Tipo"] == "Chamada Não Atendida"]
     outgoing = df[df["Tipo"] == "Chamada efetuada"]
@@ -154,30 +120,19 @@ def process_and_clean_input(input_file=INPUT_FILE, clean_output_file=CLEAN_OUTPU
         return
 
     try:
-        df = pd.read_csv(input_file, delimiter=";", skiprows=2)
+        df = load_export(input_file)
 
         df = remove_unanswered_after_received(df)
         df = df[df["Tipo"].isin(["Chamada recebida", "Chamada Não Atendida", "Chamada efetuada"])]
 
         df = df.drop_duplicates(subset="Identificador Global da Chamada").reset_index(drop=True)
 
-        # Clean unnecessary columns
-        unnecessary_columns = [
-            "Utilizador", "Telefone de Origem", "Número de Páginas do Fax", "Tipo de Telefone",
-            "Contexto de Acesso da Chamada", "Tipo de localização", "Serviço",
-            "Tempo da Fila de Espera", "País", "Identificação de chamada reencaminhada",
-            "Percurso no Grupo de Atendimento", "Tipo de Encaminhamento"
-        ]
-        df = df.drop(columns=[col for col in unnecessary_columns if col in df.columns], errors='ignore')
-
-        df["Data de Início"] = pd.to_datetime(df["Data de Início"], errors="coerce")
-
         # Filter test numbers and Paradela 
         blocked_origins = ['Anónimo', '+351938116613', '+351915942292', '+351935991897']
         blocked_destinations = ['+351234246184']
 
-        df["Origem"] = df["Origem"].str.strip().str.replace("'", "")
-        df["Destino"] = df["Destino"].str.strip().str.replace("'", "")
+        df["Origem"] = df["Origem"].str.strip()
+        df["Destino"] = df["Destino"].str.strip()
 
         df = df[~df["Origem"].isin(blocked_origins)]
         df = df[~df["Destino"].isin(blocked_destinations)]
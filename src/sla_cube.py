@@ -0,0 +1,155 @@
+import argparse
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import CUBE_FILE
+from durations import parse_durations
+
+try:
+    import pyarrow  # noqa: F401  (parquet engine)
+except ImportError:  # without pyarrow the cube is only kept in memory
+    pyarrow = None
+
+KEYS = ["date", "hour", "line", "type"]
+MEASURES = ["calls", "ring_s", "talk_s", "ring_le_20s", "ring_le_60s"]
+
+# Rollups accepted by query_cube: calendar periods, or profiles over the whole range
+PERIODS = {"hour": "h", "day": "D", "week": "W-SUN", "month": "M"}
+PROFILES = ["weekday", "hour_of_day"]
+
+
+def _seconds(values):
+    """Whole seconds of durations given as 'H:MM:SS' text or as timedeltas"""
+    if pd.api.types.is_timedelta64_dtype(values):
+        return values.dt.total_seconds().fillna(0).astype("int64")
+    return parse_durations(values).astype("int64")
+
+
+def build_cube(calls, line_column="Destino Final"):
+    """
+    Aggregate call rows into the SLA cube: one row per date × hour × line × call
+    type with the number of calls, the summed ring and talk seconds, and how many
+    rang for at most 20s and 60s. Rows without a start date are kept under a NaT
+    date, so the cube totals match the calls.
+    """
+    start = pd.to_datetime(calls["Data de Início"], errors="coerce")
+    ring = calls["Tempo de Espera (s)"].astype("int64") if "Tempo de Espera (s)" in calls.columns else _seconds(calls["Tempo de Toque"])
+    talk = calls["Duração (s)"].astype("int64") if "Duração (s)" in calls.columns else _seconds(calls["Duração"])
+
+    cube = pd.DataFrame({
+        "date": start.dt.normalize(),
+        "hour": start.dt.hour.astype("Int8"),
+        "line": calls[line_column].astype(str).str.strip(),
+        "type": calls["Tipo"].astype(str).str.strip(),
+        "ring_s": ring,
+        "talk_s": talk,
+        "ring_le_20s": (ring <= 20).astype("int64"),
+        "ring_le_60s": (ring <= 60).astype("int64"),
+    }).groupby(KEYS, dropna=False, observed=True).agg(
+        calls=("ring_s", "size"),
+        ring_s=("ring_s", "sum"),
+        talk_s=("talk_s", "sum"),
+        ring_le_20s=("ring_le_20s", "sum"),
+        ring_le_60s=("ring_le_60s", "sum"),
+    )
+    return cube.reset_index()
+
+
+def merge_cubes(*cubes):
+    """Add cubes of disjoint calls together (the measures are all sums)"""
+    cubes = [c for c in cubes if c is not None and not c.empty]
+    if not cubes:
+        return pd.DataFrame(columns=KEYS + MEASURES)
+    merged = pd.concat(cubes, ignore_index=True)
+    return merged.groupby(KEYS, dropna=False).sum()[MEASURES].reset_index()
+
+
+def load_cube(cube_file=CUBE_FILE):
+    """The persisted cube, or an empty one if there is none (or no pyarrow)"""
+    if pyarrow is None or not os.path.exists(cube_file):
+        return pd.DataFrame(columns=KEYS + MEASURES)
+    return pd.read_parquet(cube_file)
+
+
+def update_cube(cube, cube_file=CUBE_FILE):
+    """
+    Merge a run's cube into the persisted one. The dates of the new cube replace
+    those already stored, so analysing the same export twice does not count its
+    calls twice. Returns the stored cube.
+    """
+    cube_file = Path(cube_file)
+    stored = load_cube(cube_file)
+    if not stored.empty:
+        stored = stored[~stored["date"].isin(cube["date"])]
+    merged = merge_cubes(stored, cube).sort_values(KEYS, ignore_index=True)
+
+    if pyarrow is None:
+        print("⚠️ pyarrow não instalado: o cubo de SLAs não foi guardado")
+        return merged
+    cube_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cube_file.with_name(f"{cube_file.name}.{os.getpid()}.tmp")
+    merged.to_parquet(tmp, index=False)
+    os.replace(tmp, cube_file)
+    print(f"🧊 Cubo de SLAs guardado em: {cube_file}")
+    return merged
+
+
+def query_cube(cube, start=None, end=None, by="day", group=("line", "type"), lines=None, types=None):
+    """
+    Roll the cube up for a date range (inclusive, dates as 'YYYY-MM-DD').
+
+    by is a calendar period (hour, day, week, month), a profile over the range
+    (weekday: 0 = Monday, hour_of_day) or None for a single total. group lists
+    the other keys kept apart. The result has the summed measures plus the mean
+    ring/talk seconds and the share of calls that rang for at most 20s and 60s.
+    """
+    if by is not None and by not in PERIODS and by not in PROFILES:
+        raise ValueError(f"Agregação desconhecida: {by} (use {', '.join([*PERIODS, *PROFILES])})")
+    cube = cube[cube["date"].notna()]
+    if start is not None:
+        cube = cube[cube["date"] >= pd.Timestamp(start)]
+    if end is not None:
+        cube = cube[cube["date"] <= pd.Timestamp(end)]
+    if lines is not None:
+        cube = cube[cube["line"].isin(lines)]
+    if types is not None:
+        cube = cube[cube["type"].isin(types)]
+
+    keys = list(group)
+    if by == "weekday":
+        keys.insert(0, cube["date"].dt.weekday.rename("weekday"))
+    elif by == "hour_of_day":
+        keys.insert(0, "hour")
+    elif by == "hour":
+        keys.insert(0, (cube["date"] + pd.to_timedelta(cube["hour"].astype("int64"), unit="h")).rename("period"))
+    elif by is not None:
+        keys.insert(0, cube["date"].dt.to_period(PERIODS[by]).dt.start_time.rename("period"))
+
+    if keys:
+        rollup = cube.groupby(keys)[MEASURES].sum().reset_index()
+    else:
+        rollup = cube[MEASURES].sum().to_frame().T
+    calls = rollup["calls"].replace(0, np.nan)
+    rollup["mean_ring_s"] = rollup["ring_s"] / calls
+    rollup["mean_talk_s"] = rollup["talk_s"] / calls
+    rollup["pct_le_20s"] = rollup["ring_le_20s"] / calls * 100
+    rollup["pct_le_60s"] = rollup["ring_le_60s"] / calls * 100
+    return rollup
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consultar o cubo de SLAs (sem reler as chamadas)")
+    parser.add_argument("--inicio", help="Data de início YYYY-MM-DD")
+    parser.add_argument("--fim", help="Data de fim YYYY-MM-DD")
+    parser.add_argument("--por", default="day", choices=[*PERIODS, *PROFILES, "total"], help="Agregação temporal")
+    parser.add_argument("--agrupar", nargs="*", default=["type"], choices=["line", "type"], help="Chaves a manter separadas")
+    parser.add_argument("--cubo", default=CUBE_FILE, help=f"Ficheiro do cubo (por omissão: {CUBE_FILE})")
+    args = parser.parse_args()
+
+    cube = load_cube(args.cubo)
+    if cube.empty:
+        print(f"❌ Cubo vazio ou inexistente: {args.cubo}")
+    else:
+        by = None if args.por == "total" else args.por
+        print(query_cube(cube, args.inicio, args.fim, by=by, group=args.agrupar).round(2).to_string(index=False))
@@ -0,0 +1,217 @@
+import argparse
+import heapq
+from collections import Counter
+import random
+import uuid
+from datetime import datetime, timedelta
+from export_loader import DATE_FORMAT
+
+# Layout of the newer Global Connect exports (with "Chamada gravada")
+EXPORT_COLUMNS = [
+    "Tipo", "Utilizador", "Data de Início", "Tempo de Toque", "Duração", "Data de Fim",
+    "Fuso Horário", "Origem", "Destino", "Destino Final", "Serviço",
+    "Número de Páginas do Fax", "Telefone de Origem", "Tipo de localização",
+    "Tipo de Encaminhamento", "Atendida", "Percurso no Grupo de Atendimento",
+    "Tempo da Fila de Espera", "Tipo de Telefone", "Contexto de Acesso da Chamada",
+    "Identificação Chamada", "Identificador Global da Chamada",
+    "Identificação de chamada reencaminhada", "País", "Chamada gravada",
+    "Causa de Não Atendimento",
+]
+
+# Service mobile lines and the group extension each one rings
+LINES = {"962878547": "402", "962878568": "403"}
+# Paradela landline: the answering group that forwards calls to the extensions
+GROUP_NUMBER = "234246184"
+ACCOUNT = "260283"
+MISSED_CAUSES = ["Cancelada pela origem", "Sessão terminada", "Concluída noutro destino", "Destino Ocupado"]
+
+
+def _duration(seconds):
+    return str(timedelta(seconds=int(seconds)))
+
+
+class _Writer:
+    """Collects export rows and writes them newest first, like the real exports"""
+
+    def __init__(self, rnd):
+        self.rnd = rnd
+        self.rows = []
+        self.seq = 0
+
+    def gid(self):
+        return str(uuid.UUID(int=self.rnd.getrandbits(128)))
+
+    def add(self, tipo, start, ring, duration, origem, destino, destino_final, gid,
+            user="", telefone="", encaminhamento="", percurso="", tipo_telefone="Móvel GSM",
+            contexto="Desconhecido", reencaminhada="", pais="Portugal", causa=""):
+        self.seq += 1
+        end = start + timedelta(seconds=ring + (duration or 0))
+        fields = [
+            tipo, user, start.strftime(DATE_FORMAT), _duration(ring),
+            _duration(duration) if duration is not None else "", end.strftime(DATE_FORMAT),
+            "'Europe/Lisbon'", f"'{origem}'", f"'{destino}'", f"'{destino_final}'", "Chamada voz",
+            "", f"'{telefone}'" if telefone else "", "Nacional", encaminhamento,
+            "Atendida" if duration else "Não atendida", percurso, "", tipo_telefone, contexto,
+            f"'{self.seq:020d}{start:%m%d%H%M%S}00001404180{self.seq % 10}'", f"'{gid}'",
+            f"'{reencaminhada}'" if reencaminhada else "", pais, "", causa,
+        ]
+        self.rows.append((start, self.seq, fields))
+
+    def write(self, path, origin_totals=False):
+        """origin_totals adds the per-Origem call count column some older exports carry (read by src1)"""
+        self.rows.sort(reverse=True)
+        columns = EXPORT_COLUMNS + ["Total Chamadas da Origem"] if origin_totals else EXPORT_COLUMNS
+        totals = Counter(fields[7] for _, _, fields in self.rows) if origin_totals else None
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            f.write("Todas as Chamadas\n\n")
+            f.write(";".join(columns) + "\n")
+            f.writelines(
+                ";".join(fields + [str(totals[fields[7]])] if origin_totals else fields) + "\n"
+                for _, _, fields in self.rows
+            )
+
+
+def _incoming_call(out, rnd, start, customer, line, answered, forwarded, max_legs):
+    """Rows of one customer call to a service line; direct, or through the answering group"""
+    extension = LINES[line]
+    gid = out.gid()
+    if not forwarded:
+        ring = rnd.randint(2, 40)
+        duration = rnd.randint(20, 900) if answered else None
+        out.add(
+            "Chamada recebida" if answered else "Chamada Não Atendida", start, ring, duration,
+            customer, f"+351{line}", line, gid, user=f"{ACCOUNT}/{line}", telefone=f"+351{line}",
+            contexto="VoLTE" if answered else "Desconhecido",
+            causa="" if answered else rnd.choice(MISSED_CAUSES),
+        )
+        return
+
+    # Forwarded legs share the global call id: each extension rung adds a
+    # "Chamada reencaminhada" row from the group number plus the customer's leg
+    forward_id = f"{rnd.getrandbits(40)}_{rnd.getrandbits(28):09d}"
+    legs = rnd.randint(1, max_legs)
+    for leg in range(legs):
+        ring = rnd.randint(0, 25)
+        answered_leg = answered and leg == legs - 1
+        duration = rnd.randint(20, 900) if answered_leg else None
+        out.add(
+            "Chamada reencaminhada", start, ring, duration, GROUP_NUMBER, extension, extension, gid,
+            encaminhamento="Grupo de Atendimento", percurso="None", tipo_telefone="",
+            reencaminhada=forward_id, pais="",
+        )
+        if answered_leg:
+            out.add(
+                "Chamada recebida", start, ring, duration, customer, "90", extension, gid,
+                encaminhamento="Grupo de Atendimento", percurso=f"'{extension}'", tipo_telefone="",
+                reencaminhada=forward_id, pais="",
+            )
+        else:
+            out.add(
+                "Chamada Não Atendida", start, ring, None, customer, extension, line, gid,
+                user=f"{ACCOUNT}/{line}", telefone=f"+351{line}", pais="",
+                causa=rnd.choice(MISSED_CAUSES),
+            )
+        start += timedelta(seconds=ring)
+
+
+def _paradela_call(out, rnd, start, customer, answered):
+    """The single row of a customer call to the Paradela landline, rung on the group's extensions"""
+    extensions = [rnd.choice(list(LINES.values())) for _ in range(rnd.randint(1, 4))]
+    ring = rnd.randint(5, 60)
+    duration = rnd.randint(20, 900) if answered else None
+    out.add(
+        "Chamada recebida" if answered else "Chamada Não Atendida", start, ring, duration,
+        customer, f"+351{GROUP_NUMBER}", extensions[-1] if answered else GROUP_NUMBER, out.gid(),
+        encaminhamento="Grupo de Atendimento", percurso=f"'{','.join(extensions)}'", tipo_telefone="",
+        reencaminhada=f"{rnd.getrandbits(40)}_{rnd.getrandbits(28):09d}", pais="",
+        causa="" if answered else rnd.choice(MISSED_CAUSES),
+    )
+
+
+def _return_call(out, rnd, start, customer, line):
+    answered = rnd.random() < 0.7
+    out.add(
+        "Chamada efetuada", start, rnd.randint(2, 30), rnd.randint(10, 600) if answered else None,
+        line, f"+351{customer[4:]}" if customer.startswith("+351") else customer,
+        customer[4:] if customer.startswith("+351") else customer, out.gid(),
+        user=f"{ACCOUNT}/{line}" if line in LINES else "", telefone=f"+351{line}", contexto="VoLTE",
+    )
+
+
+def generate_export(path, rows, seed=0, start=datetime(2025, 1, 1, 8), customers=None,
+                    mean_gap=120, answer_rate=0.55, forward_rate=0.5, max_legs=3,
+                    retry_rate=0.4, retry_window=60, return_rate=0.5, return_window=180,
+                    landline_returns=0.2, anonymous_rate=0.01, paradela_rate=0.2, origin_totals=False):
+    """
+    Write a synthetic "Todas as Chamadas" export of about `rows` rows to `path`.
+
+    Customer calls arrive every `mean_gap` seconds on average; paradela_rate of
+    them dial the Paradela landline instead of a service line. A missed call is
+    retried by the customer with probability retry_rate (within retry_window
+    minutes) and returned by the service with probability return_rate (within
+    return_window minutes, from the Paradela landline for the calls made to it
+    and for landline_returns of the others). Returns the number of rows written.
+    """
+    rnd = random.Random(seed)
+    out = _Writer(rnd)
+    pool = [f"+3519{rnd.choice('1236')}{rnd.randint(0, 9_999_999):07d}" for _ in range(customers or max(50, rows // 25))]
+
+    # (time, order, kind, customer, paradela): retries and returns scheduled by missed calls
+    events = []
+    order = 0
+    next_arrival = start
+    while len(out.rows) < rows:
+        if events and events[0][0] <= next_arrival:
+            when, _, kind, customer, paradela = heapq.heappop(events)
+        else:
+            when, kind = next_arrival, "call"
+            customer = "Anónimo" if rnd.random() < anonymous_rate else rnd.choice(pool)
+            paradela = rnd.random() < paradela_rate
+            next_arrival += timedelta(seconds=rnd.expovariate(1 / mean_gap))
+
+        line = rnd.choice(list(LINES))
+        if kind == "return":
+            _return_call(out, rnd, when, customer, GROUP_NUMBER if paradela or rnd.random() < landline_returns else line)
+            continue
+
+        answered = rnd.random() < answer_rate
+        if paradela:
+            _paradela_call(out, rnd, when, customer, answered)
+        else:
+            _incoming_call(out, rnd, when, customer, line, answered, rnd.random() < forward_rate, max_legs)
+        if answered or customer == "Anónimo":
+            continue
+        for kind, rate, window in (("call", retry_rate, retry_window), ("return", return_rate, return_window)):
+            if rnd.random() < rate:
+                order += 1
+                heapq.heappush(events, (when + timedelta(seconds=rnd.randint(60, window * 60)), order, kind, customer, paradela))
+
+    out.write(path, origin_totals)
+    return len(out.rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerar uma exportação sintética no formato Global Connect")
+    parser.add_argument("output", help="CSV a criar")
+    parser.add_argument("rows", type=int, help="Número aproximado de linhas")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--answer-rate", type=float, default=0.55, help="Fração de chamadas atendidas")
+    parser.add_argument("--retry-rate", type=float, default=0.4, help="Probabilidade de o cliente voltar a ligar após uma não atendida")
+    parser.add_argument("--retry-window", type=int, default=60, help="Minutos máximos até o cliente voltar a ligar")
+    parser.add_argument("--return-rate", type=float, default=0.5, help="Probabilidade de uma não atendida ser devolvida")
+    parser.add_argument("--return-window", type=int, default=180, help="Minutos máximos até à devolução")
+    parser.add_argument("--landline-returns", type=float, default=0.2, help="Fração das devoluções feitas do fixo da Paradela")
+    parser.add_argument("--forward-rate", type=float, default=0.5, help="Fração de chamadas que passam pelo grupo de atendimento")
+    parser.add_argument("--max-legs", type=int, default=3, help="Máximo de extensões tocadas por chamada reencaminhada")
+    parser.add_argument("--anonymous-rate", type=float, default=0.01, help="Fração de chamadas de número anónimo")
+    parser.add_argument("--paradela-rate", type=float, default=0.2, help="Fração de chamadas feitas para o fixo da Paradela")
+    parser.add_argument("--origin-totals", action="store_true", help="Acrescentar a coluna 'Total Chamadas da Origem' (lida pelo src1)")
+    args = parser.parse_args()
+
+    written = generate_export(
+        args.output, args.rows, seed=args.seed, answer_rate=args.answer_rate, forward_rate=args.forward_rate,
+        max_legs=args.max_legs, retry_rate=args.retry_rate, retry_window=args.retry_window,
+        return_rate=args.return_rate, return_window=args.return_window, landline_returns=args.landline_returns,
+        anonymous_rate=args.anonymous_rate, paradela_rate=args.paradela_rate, origin_totals=args.origin_totals,
+    )
+    print(f"📄 {written} linhas escritas em {args.output}")
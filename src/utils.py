@@ -2,6 +2,8 @@ import os
 import glob
 import shutil
 import pandas as pd
+from durations import SECONDS_COLUMNS
+from export_loader import OUTPUT_QUOTED_COLUMNS
 
 def clear_output_directory(output_dir):
     if not os.path.exists(output_dir):
@@ -13,14 +15,26 @@ def clear_output_directory(output_dir):
             except IsADirectoryError:
                 shutil.rmtree(file_path)
 
-def normalize_number(number):
-    if pd.isna(number):
-        return ""
-    return (
-        str(number)
-        .strip()
-        .replace("'", "")
-        .replace(" ", "")
-        .removeprefix("+351")
-        .removeprefix("351")
-    )
\ No newline at end of file
+
+def first_outgoing_times(outgoing, number_col="Destino_norm", time_col="Data de Início"):
+    """Earliest outgoing call time per normalized destination number"""
+    return outgoing.groupby(number_col)[time_col].min()
+
+
+def quote_columns(df, columns=OUTPUT_QUOTED_COLUMNS):
+    """Copy of df with the given columns back in the export's single quotes"""
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            values = df[col].astype("string")
+            bare = values.notna() & ~values.str.startswith("'", na=False)
+            df[col] = df[col].astype(object).mask(bare, "'" + values[bare] + "'")
+    return df
+
+
+def write_csv(df, path, quoted=OUTPUT_QUOTED_COLUMNS):
+    """
+    Write an output CSV (';'-separated) without the SECONDS_COLUMNS helpers and
+    with the quoted columns as the export has them
+    """
+    quote_columns(df.drop(columns=SECONDS_COLUMNS, errors="ignore"), quoted).to_csv(path, index=False, sep=";")
@@ -0,0 +1,7 @@
+"""Põe a pasta src no sys.path, para os módulos de src1 usarem os partilhados: import caminho_src"""
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
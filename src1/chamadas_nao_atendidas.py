@@ -1,6 +1,8 @@
 import pandas as pd
 from datetime import datetime
-import re
+
+import caminho_src  # noqa: F401  (src no sys.path)
+from number_normalization import normalize_numbers
 
 def formatar_tempo(segundos):
     """Formata o tempo de forma inteligente: 2s, 10s, 1min, 6h30min"""
@@ -26,111 +28,105 @@ def parse_date(date_str):
         except ValueError:
             return pd.to_datetime(date_str)
         
-def normalizar_numero(numero):
-    if pd.isna(numero):
-        return ""
-    return re.sub(r"\D", "", str(numero))[-9:]  
-
 def analisar_devolucoes_e_nao_atendidas(df):
     """Analisa devoluções para chamadas efetuadas e também chamadas não atendidas nunca devolvidas"""
-    df['Data de Início'] = df['Data de Início'].apply(parse_date)
+    if not pd.api.types.is_datetime64_any_dtype(df['Data de Início']):
+        df['Data de Início'] = df['Data de Início'].apply(parse_date)
     df = df[~df['Destino'].astype(str).str.contains(r"'?4\*\*'?", regex=True)]
     df = df.sort_values('Data de Início')
 
     devolucoes = []
     nao_atendidas_nao_devolvidas = []
 
-    # Dicionário para armazenar todas as chamadas por origem
-    historico_origens = {}
-    # Dicionário para armazenar a última chamada não atendida por origem
-    ultimas_nao_atendidas = {}
-    # Set para armazenar origens que já tiveram sua devolução contabilizada
-    devolucoes_contabilizadas = set()
-
-    for _, row in df.iterrows():
-        tipo = row['Tipo'].lower()
-        data = row['Data de Início']
-        origem = str(row['Origem']).strip()
-        destino = str(row['Destino']).strip()
-        duracao = row.get('Duração', None)
-
-        # Registrar todas as chamadas no histórico
-        if origem not in historico_origens:
-            historico_origens[origem] = []
-        historico_origens[origem].append((data, tipo, duracao))
+    # Estado incremental por origem: contadores atualizados a cada chamada,
+    # sem voltar a percorrer o histórico da origem
+    estados = {}
+
+    duracoes = df['Duração'] if 'Duração' in df.columns else [None] * len(df)
+    linhas = zip(
+        df['Tipo'].str.lower(),
+        df['Data de Início'],
+        df['Origem'].astype(str).str.strip(),
+        df['Destino'].astype(str).str.strip(),
+        duracoes,
+    )
+
+    for tipo, data, origem, destino, duracao in linhas:
+        if origem not in estados:
+            estados[origem] = {
+                'pendente': None,              # última chamada não atendida ainda por devolver
+                'contabilizada': False,        # devolução já registada para a pendente
+                'primeira_nao_atendida': None,
+                'ultima_nao_atendida': None,
+                'total_nao_atendidas': 0,
+                'ultima_recebida': None,
+                'outras_chamadas': False,      # fez alguma chamada que não é recebida/não atendida
+            }
+        estado = estados[origem]
 
         # Se for uma chamada não atendida, atualizar o registro
         if 'não atendida' in tipo:
-            ultimas_nao_atendidas[origem] = data
-            # Resetar o status de devolução contabilizada para esta origem
-            if origem in devolucoes_contabilizadas:
-                devolucoes_contabilizadas.remove(origem)
+            estado['pendente'] = data
+            estado['contabilizada'] = False
+            estado['total_nao_atendidas'] += 1
+            if estado['primeira_nao_atendida'] is None or data < estado['primeira_nao_atendida']:
+                estado['primeira_nao_atendida'] = data
+            if estado['ultima_nao_atendida'] is None or data > estado['ultima_nao_atendida']:
+                estado['ultima_nao_atendida'] = data
         # Se for uma chamada recebida, remover da lista de pendentes (se existir)
-        elif 'recebida' in tipo and origem in ultimas_nao_atendidas:
-            del ultimas_nao_atendidas[origem]
-            if origem in devolucoes_contabilizadas:
-                devolucoes_contabilizadas.remove(origem)
-
-        # Se for uma chamada efetuada (potencial devolução)
-        elif tipo == 'chamada efetuada':
-            # Verificar se é uma devolução para uma origem com chamada não atendida pendente
-            if destino in ultimas_nao_atendidas and destino not in devolucoes_contabilizadas:
-                ultima_na = ultimas_nao_atendidas[destino]
-                
+        elif 'recebida' in tipo:
+            estado['ultima_recebida'] = data
+            if estado['pendente'] is not None:
+                estado['pendente'] = None
+                estado['contabilizada'] = False
+        else:
+            estado['outras_chamadas'] = True
+
+            # Se for uma chamada efetuada (potencial devolução)
+            alvo = estados.get(destino)
+            if tipo == 'chamada efetuada' and alvo is not None and alvo['pendente'] is not None and not alvo['contabilizada']:
+                ultima_na = alvo['pendente']
+
                 # Garantir que a devolução é posterior à última chamada não atendida
                 if data > ultima_na:
                     # Verificar se não houve chamada recebida entre a não atendida e a devolução
-                    houve_chamada_recebida = any(
-                        'recebida' in t and ultima_na < d < data 
-                        for d, t, _ in historico_origens[destino]
-                    )
-                    
+                    ultima_recebida = alvo['ultima_recebida']
+                    houve_chamada_recebida = ultima_recebida is not None and ultima_na < ultima_recebida < data
+
                     if not houve_chamada_recebida:
                         # Calcular tempo desde a última chamada não atendida
                         segundos = (data - ultima_na).total_seconds()
-                        
-                        # Contar quantas chamadas não atendidas essa origem fez antes da devolução
-                        total_nao_atendidas = len([d for d, t, _ in historico_origens[destino] 
-                                                  if 'não atendida' in t and d <= ultima_na])
-                        
+
                         # Registrar a devolução
                         registro = {
                             'Origem': destino,
                             'Destino': origem,
                             'Data Devolução': data,
                             'Ultima tentativa de chamada': ultima_na,
-                            'Primeira tentativa de chamada': min([d for d, t, _ in historico_origens[destino] 
-                                                                 if 'não atendida' in t]),
+                            'Primeira tentativa de chamada': alvo['primeira_nao_atendida'],
                             'Tempo até Devolução (s)': segundos,
                             'Duração': duracao,
                             'Tempo Formatado': formatar_tempo(segundos),
-                            'Total Chamadas da Origem': total_nao_atendidas,
+                            'Total Chamadas da Origem': alvo['total_nao_atendidas'],
                             'Status': 'Devolução atendida' if duracao and pd.notna(duracao) else 'Devolução não atendida'
                         }
                         devolucoes.append(registro)
-                        
+
                         # Marcar que já contabilizamos uma devolução para esta origem
-                        devolucoes_contabilizadas.add(destino)
+                        alvo['contabilizada'] = True
 
     # Identificar chamadas não atendidas que nunca foram devolvidas
-    for origem, chamadas in historico_origens.items():
-        # Verificar se é uma origem que teve chamadas não atendidas
-        if origem in ultimas_nao_atendidas:
-            # Verificar se não teve devolução contabilizada
-            if origem not in devolucoes_contabilizadas:
-                # Verificar se houve alguma chamada atendida
-                teve_chamada_atendida = any('não atendida' not in t and 'recebida' not in t for _, t, _ in chamadas)
-                
-                if not teve_chamada_atendida:
-                    nao_atendidas = [d for d, t, _ in chamadas if 'não atendida' in t]
-                    registro = {
-                        'Origem': origem,
-                        'Ultima tentativa': max(nao_atendidas),
-                        'Primeira tentativa': min(nao_atendidas),
-                        'Total Tentativas': len(nao_atendidas),
-                        'Status': 'Não atendida e não devolvida'
-                    }
-                    nao_atendidas_nao_devolvidas.append(registro)
+    for origem, estado in estados.items():
+        # Pendente, sem devolução contabilizada e sem nenhuma chamada atendida
+        if estado['pendente'] is not None and not estado['contabilizada'] and not estado['outras_chamadas']:
+            registro = {
+                'Origem': origem,
+                'Ultima tentativa': estado['ultima_nao_atendida'],
+                'Primeira tentativa': estado['primeira_nao_atendida'],
+                'Total Tentativas': estado['total_nao_atendidas'],
+                'Status': 'Não atendida e não devolvida'
+            }
+            nao_atendidas_nao_devolvidas.append(registro)
 
     df_devolucoes = pd.DataFrame(devolucoes)
     df_nao_devolvidas = pd.DataFrame(nao_atendidas_nao_devolvidas)
@@ -140,6 +136,72 @@ def analisar_devolucoes_e_nao_atendidas(df):
     
     return df_devolucoes, df_nao_devolvidas
 
+def adicionar_coluna_estado(df, devolucoes, nao_devolvidas):
+    """Marca na coluna 'Estado' as chamadas não atendidas não devolvidas e as devoluções"""
+    df['Estado'] = ""
+
+    # Normalizar colunas e classificar o tipo uma única vez
+    origem_norm = normalize_numbers(df['Origem'], 'last9')
+    destino_norm = normalize_numbers(df['Destino'], 'last9')
+    nao_atendida = df['Tipo'].str.contains('não atendida', case=False, na=False)
+    efetuada = df['Tipo'].str.contains('chamada efetuada', case=False, na=False)
+    # Exportações sem a coluna: cada chamada conta como uma da sua origem
+    total_chamadas = df.get('Total Chamadas da Origem', pd.Series(1, index=df.index))
+    com_chamadas = total_chamadas != 0
+
+    # Marcar chamadas não atendidas e não devolvidas
+    if not nao_devolvidas.empty:
+        numeros = normalize_numbers(nao_devolvidas['Origem'], 'last9').unique()
+        df.loc[origem_norm.isin(numeros) & nao_atendida & com_chamadas, 'Estado'] = "Não atendida e não devolvida"
+
+    # Marcar chamadas devolvidas
+    if not devolucoes.empty:
+        numeros = normalize_numbers(devolucoes['Destino'], 'last9').unique()
+        df.loc[destino_norm.isin(numeros) & efetuada & com_chamadas, 'Estado'] = "Não atendida e devolvida"
+
+    df.loc[total_chamadas.isna() | (total_chamadas == 0), 'Estado'] = ""
+    return df
+
+def exportar_resultados(df, devolucoes, nao_devolvidas, guardar_csv=True):
+    """Escreve chamadas.xlsx e, com guardar_csv, os CSVs lidos pelas etapas de SLAs"""
+    if not devolucoes.empty or not nao_devolvidas.empty:
+        with pd.ExcelWriter('../output/chamadas.xlsx') as writer:
+            df.to_excel(writer, sheet_name='Todas as Chamadas', index=False)
+            if not devolucoes.empty:
+                print(f"\n📊 Total de devoluções encontradas: {len(devolucoes)}\n")
+                cols = [
+                    'Origem', 'Destino', 'Data Devolução',
+                    'Ultima tentativa de chamada', 'Primeira tentativa de chamada',
+                    'Tempo Formatado', 'Total Chamadas da Origem'
+                ]
+                print("📋 Exemplos de devoluções:")
+                print(devolucoes[cols].head(10).to_markdown(index=False))
+                devolucoes.to_excel(writer, sheet_name='Chamadas Devolvidas', index=False)
+               
+                if guardar_csv:
+                    devolucoes.to_csv('../output/chamadas_devolvidas.csv', index=False, sep=';')
+            
+            if not nao_devolvidas.empty:
+                print(f"\n📊 Total de chamadas não atendidas não devolvidas: {len(nao_devolvidas)}\n")
+            cols = [
+                'Origem', 'Ultima tentativa', 'Primeira tentativa',
+                'Total Tentativas', 'Status'
+            ]
+            print("📋 Exemplos de não devolvidas:")
+            print(nao_devolvidas[cols].head(10).to_markdown(index=False))
+            nao_devolvidas.to_excel(writer, sheet_name='Não Atendidas Não Devolvidas', index=False)
+           
+            if guardar_csv:
+                nao_devolvidas.to_csv('../output/chamadas_nao_devolvidas.csv', index=False, sep=';')
+        
+        print("\n✅ Arquivos gerados:")
+        print("- chamadas.xlsx (Excel com múltiplas abas)")
+        if guardar_csv:
+            print("- chamadas_devolvidas.csv")
+            print("- chamadas_nao_devolvidas.csv")
+    else:
+        print("\n⚠️ Nenhum dado encontrado para análise.")
+
 def main():
     try:
         print("🔍 Analisando devoluções e chamadas não atendidas não devolvidas...")
@@ -151,90 +213,9 @@ def main():
         devolucoes, nao_devolvidas = analisar_devolucoes_e_nao_atendidas(df)
 
 
-        ###Aqui -TODO - Coluna estado no clean data
-        # -------------------- ADICIONA COLUNA "Estado" --------------------
-        # Começa com tudo vazio
-        df['Estado'] = ""
-
-        # Normalizar colunas para comparação
-        df['Origem_norm'] = df['Origem'].apply(normalizar_numero)
-        df['Destino_norm'] = df['Destino'].apply(normalizar_numero)
+        df = adicionar_coluna_estado(df, devolucoes, nao_devolvidas)
 
-        # Marcar chamadas não atendidas e não devolvidas
-        if not nao_devolvidas.empty:
-            for origem in nao_devolvidas['Origem']:
-                origem_norm = normalizar_numero(origem)
-                cond = (
-                    (df['Origem_norm'] == origem_norm) &
-                    (df['Tipo'].str.contains('não atendida', case=False, na=False)) &
-                    (df['Total Chamadas da Origem'] != 0)
-                )
-                df.loc[cond, 'Estado'] = "Não atendida e não devolvida"
-
-        # Marcar chamadas devolvidas
-        if not devolucoes.empty:
-            for destino in devolucoes['Destino']:
-                destino_norm = normalizar_numero(destino)
-                cond = (
-                    (df['Destino_norm'] == destino_norm) &
-                    (df['Tipo'].str.contains('chamada efetuada', case=False, na=False)) &
-                    (df['Total Chamadas da Origem'] != 0)
-                )
-                df.loc[cond, 'Estado'] = "Não atendida e devolvida"
-
-        # Preencher "Atendida à primeira" onde ainda estiver vazio, mas contagem > 0
-        # df.loc[
-        #     (df['Estado'] == "") & (df['Total Chamadas da Origem'] != 0),
-        #     'Estado'
-        # ] = "Atendida à primeira"
-
-        # Remover colunas auxiliares
-        df.drop(columns=['Origem_norm', 'Destino_norm'], inplace=True)
-
-        df.loc[df['Total Chamadas da Origem'].isna() | (df['Total Chamadas da Origem'] == 0), 'Estado'] = ""
-
-
-       
-        # ------------------------------------------------------------------
-
-
-
-
-        
-        if not devolucoes.empty or not nao_devolvidas.empty:
-            with pd.ExcelWriter('../output/chamadas.xlsx') as writer:
-                df.to_excel(writer, sheet_name='Todas as Chamadas', index=False)
-                if not devolucoes.empty:
-                    print(f"\n📊 Total de devoluções encontradas: {len(devolucoes)}\n")
-                    cols = [
-                        'Origem', 'Destino', 'Data Devolução',
-                        'Ultima tentativa de chamada', 'Primeira tentativa de chamada',
-                        'Tempo Formatado', 'Total Chamadas da Origem'
-                    ]
-                    print("📋 Exemplos de devoluções:")
-                    print(devolucoes[cols].head(10).to_markdown(index=False))
-                    devolucoes.to_excel(writer, sheet_name='Chamadas Devolvidas', index=False)
-                   
-                    devolucoes.to_csv('../output/chamadas_devolvidas.csv', index=False, sep=';')
-                
-                if not nao_devolvidas.empty:
-                    print(f"\n📊 Total de chamadas não atendidas não devolvidas: {len(nao_devolvidas)}\n")
-                cols = [
-                    'Origem', 'Ultima tentativa', 'Primeira tentativa',
-                    'Total Tentativas', 'Status'
-                ]
-                print("📋 Exemplos de não devolvidas:")
-                print(nao_devolvidas[cols].head(10).to_markdown(index=False))
-                nao_devolvidas.to_excel(writer, sheet_name='Não Atendidas Não Devolvidas', index=False)
-               
-                nao_devolvidas.to_csv('../output/chamadas_nao_devolvidas.csv', index=False, sep=';')
-            
-            print("\n✅ Arquivos gerados:")
-            print("- chamadas.xlsx (Excel com múltiplas abas)")
-            print("- chamadas_devolvidas.csv")
-            print("- chamadas_nao_devolvidas.csv")
-        else:
-            print("\n⚠️ Nenhum dado encontrado para análise.")
+        exportar_resultados(df, devolucoes, nao_devolvidas)
             
     except Exception as e:
         print(f"❌ Erro: {str(e)}")
@@ -51,33 +51,49 @@ def processar_dados(df):
 
     df['Duração'] = df['Duração'].fillna(pd.Timedelta(seconds=0))
 
-    rows = []
-    grouped = df.groupby('Identificador Global da Chamada')
-
-    for id_chamada, grupo in grouped:
-        if grupo.empty:
-            continue
-
-        grupo = grupo.sort_values('Data de Início')
-        base = grupo.iloc[-1].copy()
-
-        # Aggregation logic
-        base['Tempo de Toque'] = grupo['Tempo de Toque'].max()
-
-        if (grupo['Tipo'].str.lower() == 'chamada atendida').any():
-            base['Duração'] = grupo['Duração'].max()
-
-        base['Duração Total'] = grupo['Duração'].sum()
-        base['Tipos Envolvidos'] = ', '.join(grupo['Tipo'].dropna().unique())
-        base['Total Etapas da Chamada'] = len(grupo)
-
-        if 'Total Chamadas da Origem' in grupo.columns:
-            chamadas_validas = grupo['Total Chamadas da Origem'].replace('', pd.NA).dropna()
-            base['Total Chamadas da Origem'] = chamadas_validas.iloc[-1] if not chamadas_validas.empty else ''
-
-        rows.append(base)
+    id_col = 'Identificador Global da Chamada'
+    df = df.sort_values([id_col, 'Data de Início'], kind='stable')
+    grouped = df.groupby(id_col)
+
+    # Base: última etapa (por data) de cada chamada
+    df_resultado = grouped.tail(1)
+    chaves = df_resultado[id_col]
+
+    # Aggregation logic
+    agregados = grouped.agg(
+        tempo_toque=('Tempo de Toque', 'max'),
+        duracao_max=('Duração', 'max'),
+        duracao_total=('Duração', 'sum'),
+        total_etapas=(id_col, 'size'),
+    ).reindex(chaves)
+    atendida = (
+        df['Tipo'].str.lower().eq('chamada atendida')
+        .groupby(df[id_col]).any()
+        .reindex(chaves)
+        .to_numpy()
+    )
+    tipos = (
+        df.dropna(subset=['Tipo'])
+        .drop_duplicates([id_col, 'Tipo'])
+        .groupby(id_col)['Tipo'].agg(', '.join)
+        .reindex(chaves, fill_value='')
+    )
 
-    df_resultado = pd.DataFrame(rows)
+    df_resultado = df_resultado.copy()
+    df_resultado['Tempo de Toque'] = agregados['tempo_toque'].to_numpy()
+    df_resultado['Duração'] = df_resultado['Duração'].mask(atendida, agregados['duracao_max'].to_numpy())
+    df_resultado['Duração Total'] = agregados['duracao_total'].to_numpy()
+    df_resultado['Tipos Envolvidos'] = tipos.to_numpy()
+    df_resultado['Total Etapas da Chamada'] = agregados['total_etapas'].to_numpy()
+
+    if 'Total Chamadas da Origem' in df.columns:
+        df_resultado['Total Chamadas da Origem'] = (
+            df['Total Chamadas da Origem'].replace('', pd.NA)
+            .groupby(df[id_col]).last()
+            .reindex(chaves, fill_value='')
+            .fillna('')
+            .to_numpy()
+        )
 
     # Optional: Preserve original column order
     ordered_cols = [col for col in df.columns if col in df_resultado.columns] + \
@@ -2,17 +2,39 @@ import pandas as pd
 import os
 from pathlib import Path
 
-def formatar_numero(numero):
-    if pd.isna(numero):
-        return numero
-    numero = str(numero).strip().replace(" ", "").replace("+", "").replace("*", "").replace("'", "").replace('"', '')
-    if numero.startswith("9") and len(numero) == 9:
-        return f"+351{numero}"
-    elif numero.startswith("351") and len(numero) >= 11:
-        return f"+{numero}"
-    elif len(numero) < 9:
-        return f"{numero}***"
-    return f"+{numero}" if numero.isdigit() else numero
+import caminho_src  # noqa: F401  (src no sys.path)
+from number_normalization import normalize_numbers
+
+def colapsar_pares_duplicados(df):
+    """
+    Junta os pares 'Chamada efetuada'/'Chamada Não Atendida' com a mesma Data de Início
+    (linhas consecutivas, df já ordenado por data): a 'Causa de Não Atendimento' passa
+    para a chamada efetuada e a linha não atendida é removida.
+    """
+    tipo = df["Tipo"].astype(str).str.strip()
+    efetuada = tipo.str.contains("Chamada efetuada", regex=False)
+    nao_atendida = tipo.str.contains("Chamada Não Atendida", regex=False)
+    efetuada_anterior = efetuada.shift(fill_value=False)
+    nao_atendida_anterior = nao_atendida.shift(fill_value=False)
+
+    # par[i]: as linhas i-1 e i formam um par duplicado
+    par = df["Data de Início"].eq(df["Data de Início"].shift()) & (
+        (efetuada_anterior & nao_atendida) | (efetuada & nao_atendida_anterior)
+    )
+    nao_atendida_primeiro = par & nao_atendida_anterior
+    efetuada_primeiro = par & ~nao_atendida_anterior
+
+    # A efetuada recebe a causa da não atendida do par; se pertencer a dois pares,
+    # prevalece o par com a linha seguinte
+    causa = df["Causa de Não Atendimento"]
+    df = df.copy()
+    df["Causa de Não Atendimento"] = (
+        causa.mask(nao_atendida_primeiro, causa.shift())
+        .mask(efetuada_primeiro.shift(-1, fill_value=False), causa.shift(-1))
+    )
+
+    remover = nao_atendida_primeiro.shift(-1, fill_value=False) | efetuada_primeiro
+    return df[~remover], int(par.sum())
 
 def clean_data(data_inicio=None, data_fim=None):
     print("🚀 Iniciando limpeza de dados...")
@@ -31,6 +53,11 @@ def clean_data(data_inicio=None, data_fim=None):
         print(f"❌ Erro ao ler o CSV: {e}")
         return
 
+    df = limpar_dados(df, data_inicio=data_inicio, data_fim=data_fim)
+    guardar_dados_limpos(df)
+
+def limpar_dados(df, data_inicio=None, data_fim=None):
+    """Filtra (datas, chamadas voz, destinos da linha) e normaliza os números de um DataFrame já carregado"""
     df["Data de Início"] = pd.to_datetime(df["Data de Início"], errors="coerce")
     initial_count = len(df)
     df = df.dropna(subset=["Data de Início"])
@@ -76,30 +103,9 @@ def clean_data(data_inicio=None, data_fim=None):
     df = df.sort_values(by="Data de Início")
     print(f"🔢 Dados ordenados por data. Primeira data: {df['Data de Início'].iloc[0]}, Última data: {df['Data de Início'].iloc[-1]}")
 
-    to_remove_indices = []
-    duplicate_pairs_found = 0
-
-    for i in range(1, len(df)):
-        current_time = df.iloc[i]["Data de Início"]
-        previous_time = df.iloc[i-1]["Data de Início"]
-        if current_time == previous_time:
-            tipo_anterior = str(df.iloc[i-1]["Tipo"]).strip()
-            tipo_atual = str(df.iloc[i]["Tipo"]).strip()
-            if (("Chamada efetuada" in tipo_anterior and "Chamada Não Atendida" in tipo_atual) or
-                ("Chamada efetuada" in tipo_atual and "Chamada Não Atendida" in tipo_anterior)):
-                duplicate_pairs_found += 1
-                if "Chamada Não Atendida" in tipo_anterior:
-                    causa = df.iloc[i-1]["Causa de Não Atendimento"]
-                    df.at[df.index[i], "Causa de Não Atendimento"] = causa
-                    to_remove_indices.append(df.index[i-1])
-                else:
-                    causa = df.iloc[i]["Causa de Não Atendimento"]
-                    df.at[df.index[i-1], "Causa de Não Atendimento"] = causa
-                    to_remove_indices.append(df.index[i])
-
-    if to_remove_indices:
-        print(f"\n🗑️ Removendo {len(to_remove_indices)} linhas de 'Chamada Não Atendida'")
-        df = df.drop(index=to_remove_indices)
+    df, duplicate_pairs_found = colapsar_pares_duplicados(df)
+    if duplicate_pairs_found:
+        print(f"\n🗑️ Removendo {duplicate_pairs_found} linhas de 'Chamada Não Atendida'")
     else:
         print("\nℹ️ Nenhuma duplicata para remover")
 
@@ -116,14 +122,15 @@ def clean_data(data_inicio=None, data_fim=None):
     colunas_para_formatar = ['Origem', 'Destino', 'Destino Final']
     for col in colunas_para_formatar:
         if col in df.columns:
-            df[col] = df[col].apply(formatar_numero)
+            df[col] = normalize_numbers(df[col], 'e164')
         else:
             print(f"⚠️ Coluna '{col}' não encontrada no DataFrame.")
 
     print(df[['Origem', 'Destino', 'Destino Final']].head(10))
 
-    df = df.sort_values(by="Data de Início", ascending=False).reset_index(drop=True)
+    return df.sort_values(by="Data de Início", ascending=False).reset_index(drop=True)
 
+def guardar_dados_limpos(df):
     output_dir = "../output"
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, "clean_data.csv")
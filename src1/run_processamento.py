@@ -1,4 +1,5 @@
 import argparse
+import pandas as pd
 import contagem_nrs_unicos
 import chamadas_nao_atendidas
 import setup_environment
@@ -7,6 +8,15 @@ import calculo_SLAs
 import display_SLAs
 from datetime import datetime
 
+import caminho_src  # noqa: F401  (src no sys.path)
+import profiling
+import sla_cube
+from profiling import stage
+
+# Chamadas lidas para lá de data_fim, só para encontrar as devoluções das
+# não atendidas do fim do período (o que sai das etapas acaba em data_fim)
+MARGEM_DEVOLUCOES = pd.Timedelta(days=1)
+
 def validar_data(data_str):
     """Valida o formato da data e converte para string formatada"""
     try:
@@ -15,22 +25,86 @@ def validar_data(data_str):
     except ValueError:
         raise ValueError("Formato de data inválido. Use YYYY-MM-DD")
 
-def run_all(data_inicio=None, data_fim=None):
+def chamadas_para_devolucoes(df_margem, data_fim):
+    """
+    As chamadas do período mais as da margem que podem resolver uma não atendida
+    do período (devoluções e chamadas atendidas); as não atendidas da margem ficam de fora
+    """
+    nao_atendida = df_margem["Tipo"].astype(str).str.lower().str.contains("não atendida", regex=False)
+    return df_margem[(df_margem["Data de Início"] <= pd.to_datetime(data_fim)) | ~nao_atendida]
+
+def run_all(data_inicio=None, data_fim=None, checkpoints=False, input_file=setup_environment.INPUT_FILE):
+    """
+    Corre as etapas em sequência, passando os DataFrames em memória.
+
+    O intervalo de datas é aplicado logo na leitura, até data_fim mais
+    MARGEM_DEVOLUCOES, para que as devoluções logo a seguir ao fim do período
+    contem; a margem só entra na análise das devoluções.
+
+    Com checkpoints, cada etapa escreve também os CSVs em ../output que o seu
+    main() escreveria (clean_data.csv, chamadas_devolvidas.csv, ...), para
+    inspecionar ou recomeçar a partir de uma etapa.
+    """
     print(f"\n🔎 Executando processamento com filtro:")
     print(f"• Data início: {data_inicio if data_inicio else 'Não definida'}")
     print(f"• Data fim: {data_fim if data_fim else 'Não definida'}")
     
-    setup_environment.setup_cleaning_environment()
-    contagem_nrs_unicos.main()
-    limpeza_dados.clean_data(data_inicio=data_inicio, data_fim=data_fim) 
-    chamadas_nao_atendidas.main()  
-    calculo_SLAs.processar_dados_chamadas()
-    display_SLAs.main()
+    fim_leitura = pd.to_datetime(data_fim) + MARGEM_DEVOLUCOES if data_fim else None
+    with stage("setup_environment") as etapa:
+        df = setup_environment.setup_cleaning_environment(
+            guardar_csv=checkpoints, input_file=input_file, data_inicio=data_inicio, data_fim=fim_leitura
+        )
+        etapa["rows_out"] = None if df is None else len(df)
+    if df is None:
+        return
+
+    print("\n🚀 Iniciando processamento de contagem e unificação de chamadas...")
+    with stage("contagem_nrs_unicos", len(df)) as etapa:
+        df = contagem_nrs_unicos.contar_chamadas_por_identificador(df)
+        df = contagem_nrs_unicos.processar_dados(df)
+        if checkpoints:
+            contagem_nrs_unicos.exportar_resultados(df, setup_environment.OUTPUT_FILE)
+        etapa["rows_out"] = len(df)
+
+    with stage("limpeza_dados", len(df)) as etapa:
+        df_margem = limpeza_dados.limpar_dados(df, data_inicio=data_inicio, data_fim=fim_leitura)
+        df = df_margem
+        if data_fim:
+            df = df_margem[df_margem["Data de Início"] <= pd.to_datetime(data_fim)].reset_index(drop=True)
+        if checkpoints:
+            limpeza_dados.guardar_dados_limpos(df)
+        etapa["rows_out"] = len(df)
+
+    with stage("sla_cube", len(df)) as etapa:
+        cubo = sla_cube.build_cube(df)
+        sla_cube.update_cube(cubo)
+        etapa["rows_out"] = len(cubo)
+
+    try:
+        with stage("chamadas_nao_atendidas", len(df)) as etapa:
+            print("🔍 Analisando devoluções e chamadas não atendidas não devolvidas...")
+            chamadas = chamadas_para_devolucoes(df_margem, data_fim) if data_fim else df
+            devolucoes, nao_devolvidas = chamadas_nao_atendidas.analisar_devolucoes_e_nao_atendidas(chamadas)
+            df_estado = chamadas_nao_atendidas.adicionar_coluna_estado(df.copy(), devolucoes, nao_devolvidas)
+            chamadas_nao_atendidas.exportar_resultados(df_estado, devolucoes, nao_devolvidas, guardar_csv=checkpoints)
+            etapa["rows_out"] = len(devolucoes) + len(nao_devolvidas)
+    except Exception as e:
+        # Sem devoluções as etapas de SLAs não correm: sair com erro, não em silêncio
+        print(f"❌ Erro: {str(e)}")
+        raise
+
+    with stage("calculo_SLAs", len(df)):
+        calculo_SLAs.processar_dados_chamadas(df, devolucoes, nao_devolvidas)
+    with stage("display_SLAs", len(df)):
+        display_SLAs.main(df, devolucoes, nao_devolvidas, cubo)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Processar dados de chamadas telefônicas')
+    parser.add_argument('--input', default=setup_environment.INPUT_FILE, help=f'CSV exportado, ou pasta do dataset particionado, a processar (por omissão: {setup_environment.INPUT_FILE})')
     parser.add_argument('--inicio', help='Data de início no formato YYYY-MM-DD (ex: 2023-01-01)')
     parser.add_argument('--fim', help='Data de fim no formato YYYY-MM-DD (ex: 2023-12-31)')
+    parser.add_argument('--checkpoints', action='store_true', help='Escrever os CSVs intermédios de cada etapa em ../output')
+    parser.add_argument('--profile', action='store_true', help='Medir cada etapa e guardar o relatório em src/logs/profile_processamento.json')
     
     args = parser.parse_args()
     
@@ -45,4 +119,7 @@ if __name__ == "__main__":
     data_inicio = validar_data(args.inicio) if args.inicio else None
     data_fim = validar_data(args.fim) if args.fim else None
     
-    run_all(data_inicio=data_inicio, data_fim=data_fim)
\ No newline at end of file
+    if args.profile:
+        profiling.enable()
+    run_all(data_inicio=data_inicio, data_fim=data_fim, checkpoints=args.checkpoints, input_file=args.input)
+    profiling.write_report("processamento", input_file=args.input, data_inicio=data_inicio, data_fim=data_fim)
\ No newline at end of file
@@ -2,12 +2,21 @@ import os
 import glob
 import shutil
 from pathlib import Path
-import pandas as pd
+
+import caminho_src  # noqa: F401  (src no sys.path)
+from call_dataset import load_calls
 
 INPUT_FILE = "../input/março.csv"
 OUTPUT_FOLDER = "../output"
 OUTPUT_FILE = os.path.join(OUTPUT_FOLDER, "clean_data.csv")
 
+# Colunas que nenhuma etapa lê antes de limpeza_dados as remover
+COLUNAS_NAO_USADAS = [
+    "Fuso Horário", "Número de Páginas do Fax", "Tempo da Fila de Espera",
+    "Percurso no Grupo de Atendimento", "Identificação de chamada reencaminhada",
+    "Contexto de Acesso da Chamada", "Tipo de Telefone", "Tipo de localização", "Utilizador", "País"
+]
+
 def remove_output_files(output_folder=OUTPUT_FOLDER):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -21,29 +30,59 @@ def remove_output_files(output_folder=OUTPUT_FOLDER):
                 shutil.rmtree(f)
         print(f"🧼 Diretório limpo: {output_folder}")
 
-def copy_input_to_output(input_file=INPUT_FILE, output_file=OUTPUT_FILE):
+def carregar_input(input_file=INPUT_FILE, data_inicio=None, data_fim=None):
+    """
+    Lê a exportação já tipada (datas como datetime, números como texto); None se falhar.
+    input_file pode ser também a pasta do dataset particionado por ano/mês (call_dataset).
+    Com data_inicio/data_fim, só as chamadas iniciadas nesse intervalo são guardadas,
+    bloco a bloco durante a leitura (no dataset, só os meses do intervalo são abertos).
+    """
     if not Path(input_file).exists():
         print(f"❌ Arquivo de input não encontrado: {input_file}")
-        return
+        return None
 
     try:
-        # Read CSV skipping first 2 rows (header and notes)
-        df = pd.read_csv(input_file, delimiter=";", skiprows=2)
+        # Read CSV skipping first 2 rows (header and notes), without the unused columns.
+        # As aspas dos números ficam: as etapas corridas a partir do CSV relêem-no e
+        # dependem delas para não converter números em float
+        intervalo = (data_inicio, data_fim) if data_inicio is not None or data_fim is not None else None
+        df = load_calls(input_file, intervalo, drop_columns=COLUNAS_NAO_USADAS, unquote=False)
+        if intervalo:
+            print(f"📅 {len(df)} linhas lidas no intervalo {data_inicio or '...'} a {data_fim or '...'}")
         
         # Validate important columns
         required_cols = ['Origem', 'Data de Início', 'Tipo']
         missing_cols = [col for col in required_cols if col not in df.columns]
         if missing_cols:
             print(f"⚠️ Aviso: Colunas obrigatórias ausentes após leitura: {missing_cols}")
+        return df
+    except Exception as e:
+        print(f"❌ Erro ao processar o ficheiro de input: {e}")
+        return None
 
+def copy_input_to_output(input_file=INPUT_FILE, output_file=OUTPUT_FILE, data_inicio=None, data_fim=None):
+    df = carregar_input(input_file, data_inicio, data_fim)
+    if df is None:
+        return None
+
+    try:
         # Write cleaned version to output
         df.to_csv(output_file, index=False, sep=";")
         print(f"📄 Ficheiro processado e copiado: {input_file} ➡️ {output_file}")
     except Exception as e:
         print(f"❌ Erro ao processar o ficheiro de input: {e}")
+    return df
 
-def setup_cleaning_environment():
+def setup_cleaning_environment(guardar_csv=True, input_file=INPUT_FILE, data_inicio=None, data_fim=None):
+    """
+    Limpa ../output e devolve a exportação carregada (só o intervalo de datas, se
+    indicado); com guardar_csv, copia-a para clean_data.csv
+    """
     print("🧹 Preparando ambiente de limpeza...")
     remove_output_files()
-    copy_input_to_output()
+    if guardar_csv:
+        df = copy_input_to_output(input_file, data_inicio=data_inicio, data_fim=data_fim)
+    else:
+        df = carregar_input(input_file, data_inicio, data_fim)
     print("✅ Ambiente pronto.")
+    return df